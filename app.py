@@ -1,12 +1,24 @@
 from datetime import datetime, timedelta, timezone
+import base64
+from bisect import bisect_left, bisect_right
+import csv
+import io
+import json
+from collections import OrderedDict, namedtuple
+import copy
 from functools import wraps
 import hashlib
 import os
 import re
-import pdfcrowd
+import threading
+import time
 import pytz
-from flask import Flask, jsonify, redirect, url_for, render_template, request, make_response
-from pymongo import MongoClient
+import click
+from flask import Flask, Response, g, has_app_context, has_request_context, jsonify, redirect, url_for, render_template, request, make_response, stream_with_context
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from bson import ObjectId, json_util
+from bson.errors import BSONError
 import jwt
 from dotenv import load_dotenv
 from os.path import join, dirname
@@ -14,8 +26,12 @@ from babel.numbers import format_currency
 from babel.dates import format_date, format_datetime, format_time
 import locale
 from uuid import uuid4
-from imagekitio import ImageKit
-from werkzeug.utils import secure_filename
+from image_uploads import image_variant, submit_upload, upload_file_name
+from receipt_renderer import ReceiptRenderError, render_receipt
+from fragment_cache import FragmentCacheExtension, clear_fragment_cache, fragment_cache_stats
+from request_metrics import init_request_metrics, mongo_listener, render_metrics, start_capture, stop_capture
+from menu_search import MenuSearchIndex
+from currency_format import format_field, formatted_currency, formatted_currency_many
 
 
 dotenv_path = join(dirname(__file__), ".env")
@@ -28,21 +44,51 @@ app.config["TEMPLATES_AUTO_RELOAD"] = True
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
 
-PUBLIC_KEY_TOKEN_IMAGEKIT = os.environ.get("PUBLIC_KEY_TOKEN_IMAGEKIT")
-PRIVATE_KEY_TOKEN_IMAGEKIT =  os.environ.get("PRIVATE_KEY_TOKEN_IMAGEKIT")
-
-API_USERNAME = os.environ.get("API_USERNAME")
-API_KEY = os.environ.get("API_KEY")
-
 MONGODB_URI = os.environ.get("MONGODB_URI")
 DB_NAME = os.environ.get("DB_NAME")
 
-client = MongoClient(MONGODB_URI)
-db = client[DB_NAME]
-def formatted_currency(amount, currency='IDR', locale='id_ID'):
-    formatted_value = format_currency(amount, currency, locale=locale)
-    formatted_value = formatted_value.replace('Rp', 'Rp ')
-    return formatted_value
+
+# ===================================== MONGO CLIENT =====================================
+# MongoClient tidak aman dipakai lintas fork. Di production app di-load sekali di master
+# gunicorn lalu worker di-fork, jadi client baru dibuat saat pertama dipakai di setiap proses.
+mongo_client_lock = threading.Lock()
+mongo_client = {"pid": None, "client": None}
+
+
+def get_mongo_client():
+    pid = os.getpid()
+    if mongo_client["pid"] != pid:
+        with mongo_client_lock:
+            if mongo_client["pid"] != pid:
+                # client milik proses induk tidak ditutup di sini, cukup tidak dipakai lagi
+                mongo_client["client"] = MongoClient(MONGODB_URI, event_listeners=[mongo_listener])
+                mongo_client["pid"] = pid
+    return mongo_client["client"]
+
+
+def close_mongo_client():
+    with mongo_client_lock:
+        if mongo_client["client"] is not None and mongo_client["pid"] == os.getpid():
+            mongo_client["client"].close()
+        mongo_client["client"] = None
+        mongo_client["pid"] = None
+
+
+class LazyDatabase:
+    """Pengganti client[DB_NAME] yang membuat koneksi saat collection pertama kali diakses."""
+
+    def __getattr__(self, name):
+        return getattr(get_mongo_client()[DB_NAME], name)
+
+    def __getitem__(self, name):
+        return get_mongo_client()[DB_NAME][name]
+
+
+db = LazyDatabase()
+
+# dipasang sebelum hook lain supaya latency mencakup seluruh request
+init_request_metrics(app)
+
 
 def formatted_number(amount):
     return f"{amount:,.0f}".replace(",", ".")
@@ -54,43 +100,505 @@ app.jinja_env.filters["formatted_number"] = formatted_number
 
 app.jinja_env.filters["formatted_currency_filter"] = formatted_currency
 
+app.jinja_env.filters["image_variant"] = image_variant
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+# ===================================== PROJECTIONS =====================================
+# Field yang boleh diambil per tampilan. Query ke users dan menu memakai find_profile /
+# find_one_profile supaya setiap route hanya mentransfer field yang dirender
+# (navbar tidak butuh cart, password hash atau alamat). Cek dengan: flask audit-projections
+USER_NAVBAR_FIELDS = ["email", "user_name", "role", "profile_image", "profile_image_variants"]
+PROJECTIONS = {
+    "users": {
+        "navbar": USER_NAVBAR_FIELDS,
+        "profile": USER_NAVBAR_FIELDS + ["phone_number", "address"],
+        "account": USER_NAVBAR_FIELDS + ["phone_number", "address", "password"],
+        "auth": ["email", "password", "role"],
+        "exists": ["email"],
+        "names": ["email", "user_name"],
+        "reviewer": ["email", "user_name", "profile_image", "profile_image_variants"],
+        "cart": ["email", "cart"],
+        "admin-list": USER_NAVBAR_FIELDS,
+    },
+    "menu": {
+        "catalog": [
+            "menuId", "nama", "harga", "deskripsi", "kategori", "image", "image_variants", "sold",
+            "rating_1", "rating_2", "rating_3", "rating_4", "rating_5",
+            "rating_count", "rating_sum", "average_rating",
+        ],
+        "cart-line": ["menuId", "nama", "harga", "image", "image_variants"],
+        "ids": ["menuId"],
+    },
+}
+
+
+def projection(collection, profile):
+    return {"_id": False, **{field: True for field in PROJECTIONS[collection][profile]}}
+
+
+def find_profile(collection, query, profile, **kwargs):
+    return db[collection].find(query, projection(collection, profile), **kwargs)
+
+
+def find_one_profile(collection, query, profile, **kwargs):
+    return db[collection].find_one(query, projection(collection, profile), **kwargs)
+
+
+# ===================================== SHARED CACHE VERSION =====================================
+# Cache menu, halaman dan user ada di memori tiap worker gunicorn. Setiap invalidasi menaikkan
+# versi di dokumen counters {"_id": "cache_versions"}; tiap worker membaca dokumen itu paling
+# sering sekali per CACHE_VERSION_CHECK_INTERVAL detik (bukan per request, supaya cache hit tetap
+# tanpa round trip ke Mongo) dan membuang cache lokalnya kalau versinya sudah berubah.
+# Artinya perubahan dari worker lain (harga, role user, dll) bisa terlambat terlihat paling lama
+# CACHE_VERSION_CHECK_INTERVAL detik; checkout tetap membaca harga langsung dari Mongo.
+CACHE_VERSION_ID = "cache_versions"
+CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get("CACHE_VERSION_CHECK_INTERVAL", 2))
+
+shared_version_lock = threading.Lock()
+seen_versions = {"menu": None, "users": None}
+version_check = {"checked_at": None}
+
+
+def drop_shared_cache(name):
+    if name == "menu":
+        drop_menu_cache()
+    elif name == "users":
+        drop_user_cache()
+
+
+def bump_shared_version(name):
+    doc = db.counters.find_one_and_update(
+        {"_id": CACHE_VERSION_ID},
+        {"$inc": {name: 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    with shared_version_lock:
+        previous = seen_versions[name]
+        seen_versions[name] = doc[name]
+    # kalau worker lain sudah menaikkan versi sebelum ini, perubahan mereka belum pernah
+    # dibuang dari cache lokal: buang semuanya sebelum versi baru dianggap sudah terlihat
+    if previous is None or doc[name] != previous + 1:
+        drop_shared_cache(name)
+
+
+def sync_shared_caches():
+    now = time.monotonic()
+    with shared_version_lock:
+        checked_at = version_check["checked_at"]
+        if checked_at is not None and now - checked_at < CACHE_VERSION_CHECK_INTERVAL:
+            return
+        # dicatat sebelum query supaya thread lain tidak ikut memeriksa bersamaan
+        version_check["checked_at"] = now
+
+    doc = db.counters.find_one({"_id": CACHE_VERSION_ID}) or {}
+    with shared_version_lock:
+        stale = [name for name in seen_versions if seen_versions[name] != doc.get(name, 0)]
+        for name in stale:
+            seen_versions[name] = doc.get(name, 0)
+    for name in stale:
+        drop_shared_cache(name)
+
+
+# ===================================== MENU CACHE =====================================
+# Katalog menu disimpan di memori per worker. Perubahan dari admin (tambah, edit,
+# hapus produk) memanggil invalidate_menu_cache(), yang juga sampai ke worker lain lewat
+# versi bersama; counter seperti "sold" dan "rating_*" cukup di-refresh setelah TTL.
+MENU_CACHE_TTL = int(os.environ.get("MENU_CACHE_TTL", 30))
+
+menu_cache_lock = threading.Lock()
+menu_cache = {
+    "version": 0,
+    "loaded_at": 0,
+    "catalog": None,
+    "generation": 0,
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def load_menu_catalog():
+    sync_shared_caches()
+    with menu_cache_lock:
+        expired = time.monotonic() - menu_cache["loaded_at"] > MENU_CACHE_TTL
+        if menu_cache["catalog"] is not None and not expired:
+            menu_cache["hits"] += 1
+            return remember_menu_snapshot(menu_cache["catalog"])
+
+        menu_cache["misses"] += 1
+        menu_cache["generation"] += 1
+        items = list(find_profile("menu", {}, "catalog"))
+        by_kategori = {}
+        for item in items:
+            for kategori in item.get("kategori") or []:
+                by_kategori.setdefault(kategori, []).append(item)
+
+        menu_cache["catalog"] = {
+            "version": menu_cache["version"],
+            "generation": menu_cache["generation"],
+            "items": items,
+            "by_id": {item["menuId"]: item for item in items},
+            "by_kategori": by_kategori,
+            # urutan per (kategori, sort) untuk /filter_menu, diisi saat pertama dipakai
+            "orderings": {},
+        }
+        menu_cache["loaded_at"] = time.monotonic()
+        return remember_menu_snapshot(menu_cache["catalog"])
+
+
+def remember_menu_snapshot(catalog):
+    # versi snapshot yang dibaca view disimpan di g, jadi fragment template di-key dengan data
+    # yang benar-benar dipakai walaupun thread lain me-reload katalog sebelum template dirender
+    if has_request_context():
+        version = (catalog["version"], catalog["generation"])
+        if "menu_snapshot_version" not in g:
+            g.menu_snapshot_version = version
+        elif g.menu_snapshot_version != version:
+            # request ini membaca dua snapshot berbeda: fragmentnya tidak disimpan
+            g.menu_snapshot_version = None
+    return catalog
+
+
+def drop_menu_cache():
+    with menu_cache_lock:
+        menu_cache["version"] += 1
+        menu_cache["catalog"] = None
+    clear_page_cache()
+    clear_fragment_cache()
+
+
+def invalidate_menu_cache():
+    drop_menu_cache()
+    bump_shared_version("menu")
+
+
+# versi data untuk fragment cache template: versi snapshot katalog yang dibaca view di request
+# ini (None = jangan simpan fragment), atau versi terbaru kalau view tidak membaca katalog
+def menu_data_version():
+    if has_request_context() and "menu_snapshot_version" in g:
+        return g.menu_snapshot_version
+    with menu_cache_lock:
+        return (menu_cache["version"], menu_cache["generation"])
+
+
+app.jinja_env.fragment_cache_version = menu_data_version
+
+
+# route memodifikasi dokumen menu (format harga dll), jadi selalu kembalikan salinan
+def get_all_menus():
+    return [dict(item) for item in load_menu_catalog()["items"]]
+
+
+def get_menus_by_kategori(categories):
+    catalog = load_menu_catalog()
+    if isinstance(categories, str):
+        categories = [categories]
+
+    menus = []
+    seen = set()
+    for kategori in categories:
+        for item in catalog["by_kategori"].get(kategori, []):
+            if item["menuId"] not in seen:
+                seen.add(item["menuId"])
+                menus.append(item)
+    # urutan mengikuti katalog, sama seperti hasil find() ke Mongo
+    order = {item["menuId"]: index for index, item in enumerate(catalog["items"])}
+    menus.sort(key=lambda item: order[item["menuId"]])
+    return [dict(item) for item in menus]
+
+
+def get_menu_by_id(menu_id):
+    item = load_menu_catalog()["by_id"].get(menu_id)
+    return dict(item) if item else None
+
+
+def menu_cache_stats():
+    with menu_cache_lock:
+        return {
+            "version": menu_cache["version"],
+            "items": len(menu_cache["catalog"]["items"]) if menu_cache["catalog"] else 0,
+            "hits": menu_cache["hits"],
+            "misses": menu_cache["misses"],
+            "ttl": MENU_CACHE_TTL,
+        }
+
+
+# ===================================== PAGE CACHE =====================================
+# Halaman storefront untuk pengunjung yang belum login (tanpa cookie mytoken) disimpan
+# utuh per path + query string, dengan batas jumlah entry dan total byte (LRU).
+# Setiap response diberi ETag kuat, jadi browser/CDN cukup revalidate dan dapat 304.
+# Cache dikosongkan oleh invalidate_menu_cache(); counter menu (sold, rating) ikut TTL.
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 60))
+PAGE_CACHE_MAX_ENTRIES = 256
+PAGE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+page_cache_lock = threading.Lock()
+page_cache = {
+    "version": 0,
+    "entries": OrderedDict(),
+    "bytes": 0,
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def clear_page_cache():
+    with page_cache_lock:
+        page_cache["version"] += 1
+        page_cache["entries"].clear()
+        page_cache["bytes"] = 0
+
+
+def get_cached_page(key):
+    with page_cache_lock:
+        entry = page_cache["entries"].get(key)
+        if entry and entry["expires_at"] > time.monotonic():
+            page_cache["entries"].move_to_end(key)
+            page_cache["hits"] += 1
+            return entry
+        if entry:
+            page_cache["bytes"] -= len(entry["body"])
+            del page_cache["entries"][key]
+        page_cache["misses"] += 1
+        return None
+
+
+def store_cached_page(key, version, body, mimetype):
+    if len(body) > PAGE_CACHE_MAX_BYTES:
+        return None
+    entry = {
+        "body": body,
+        "mimetype": mimetype,
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "expires_at": time.monotonic() + PAGE_CACHE_TTL,
+    }
+    with page_cache_lock:
+        # jangan simpan hasil render yang dimulai sebelum cache dikosongkan
+        if page_cache["version"] != version:
+            return entry
+        old = page_cache["entries"].pop(key, None)
+        if old:
+            page_cache["bytes"] -= len(old["body"])
+        page_cache["entries"][key] = entry
+        page_cache["bytes"] += len(body)
+        while (
+            len(page_cache["entries"]) > PAGE_CACHE_MAX_ENTRIES
+            or page_cache["bytes"] > PAGE_CACHE_MAX_BYTES
+        ):
+            _, evicted = page_cache["entries"].popitem(last=False)
+            page_cache["bytes"] -= len(evicted["body"])
+    return entry
+
+
+def page_response(entry):
+    response = make_response(entry["body"])
+    response.mimetype = entry["mimetype"]
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = "public, no-cache"
+    # halaman yang sama tampil berbeda untuk user yang login
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+def cache_anonymous_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or request.cookies.get("mytoken"):
+            return view(*args, **kwargs)
+
+        sync_shared_caches()
+        key = request.full_path
+        entry = get_cached_page(key)
+        if entry:
+            return page_response(entry)
+
+        with page_cache_lock:
+            version = page_cache["version"]
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough or "Set-Cookie" in response.headers:
+            return response
+        entry = store_cached_page(key, version, response.get_data(), response.mimetype)
+        return page_response(entry) if entry else response
+
+    return wrapper
+
+
+def page_cache_stats():
+    with page_cache_lock:
+        return {
+            "version": page_cache["version"],
+            "entries": len(page_cache["entries"]),
+            "bytes": page_cache["bytes"],
+            "hits": page_cache["hits"],
+            "misses": page_cache["misses"],
+            "ttl": PAGE_CACHE_TTL,
+        }
+
+
+# ===================================== AUTH CONTEXT =====================================
+# Token di-decode sekali per request di before_request, user di-load sekali ke g dan
+# disimpan sebentar di cache per worker, per projection profile (default "navbar").
+# Cart dibaca lewat get_cart(), dan route yang memeriksa password memakai
+# get_current_user(fresh=True, profile="account") supaya tidak memakai data cache.
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 10))
+USER_CACHE_MAX_SIZE = 1024
+
+user_cache_lock = threading.Lock()
+user_cache = {}
+
+
+@app.before_request
+def load_auth_context():
+    g.user_email = None
+    g.auth_error = None
+    token_receive = request.cookies.get("mytoken")
+    try:
+        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
+        g.user_email = payload["id"]
+    except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError) as e:
+        g.auth_error = e
+
+
+def get_current_email():
+    if g.auth_error:
+        raise g.auth_error
+    return g.user_email
+
+
+def get_current_user(fresh=False, profile="navbar"):
+    email = get_current_email()
+    key = (email, profile)
+    user_profiles = g.setdefault("user_profiles", {})
+    if key in user_profiles and not fresh:
+        return copy.deepcopy(user_profiles[key])
+
+    now = time.monotonic()
+    user_info = None
+    if not fresh:
+        sync_shared_caches()
+        with user_cache_lock:
+            cached = user_cache.get(key)
+        if cached and cached[0] > now:
+            user_info = cached[1]
+
+    if user_info is None:
+        user_info = find_one_profile("users", {"email": email}, profile)
+        if user_info:
+            with user_cache_lock:
+                if len(user_cache) >= USER_CACHE_MAX_SIZE:
+                    user_cache.pop(next(iter(user_cache)))
+                user_cache[key] = (now + USER_CACHE_TTL, user_info)
+
+    user_profiles[key] = user_info
+    return copy.deepcopy(user_info)
+
+
+def drop_user_cache():
+    with user_cache_lock:
+        user_cache.clear()
+
+
+def invalidate_user_cache(*emails):
+    keys = [(email, profile) for email in emails for profile in PROJECTIONS["users"]]
+    with user_cache_lock:
+        for key in keys:
+            user_cache.pop(key, None)
+    # bisa dipanggil dari thread upload di luar request
+    if has_app_context() and "user_profiles" in g:
+        for key in keys:
+            g.user_profiles.pop(key, None)
+    # worker lain tidak tahu email mana yang berubah, jadi mereka membuang seluruh cache user
+    bump_shared_version("users")
+
+
+# ===================================== PAGINATION =====================================
+# Keyset pagination: halaman berikutnya dicari dari nilai sort key + _id dokumen terakhir,
+# jadi biayanya tetap walaupun koleksi makin besar (tidak pakai skip).
+# Cursor dibuat opaque (base64) supaya client tidak bergantung ke formatnya.
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json_util.dumps(list(values)).encode("utf-8")).decode("ascii")
+
+
+CURSOR_VALUE_TYPES = (str, int, float, bool, datetime, ObjectId, type(None))
+
+
+def decode_cursor(cursor):
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, BSONError):
+        # BSONError: mis. {"$oid": "zz"} (InvalidId) dari cursor yang dibuat sendiri oleh client
+        return None
+    # cursor datang dari client: hanya nilai skalar yang boleh masuk ke query,
+    # dokumen seperti {"$gt": ""} akan ikut menjadi operator di filter
+    if not isinstance(values, list) or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        return None
+    return values
+
+
+def find_page(collection, query, sort_field, descending=True, cursor=None, limit=20, projection=None):
+    """Satu halaman dokumen dan cursor halaman berikutnya. ValueError kalau cursor tidak valid."""
+    query = dict(query)
+    if cursor:
+        last = decode_cursor(cursor)
+        if not isinstance(last, list) or len(last) != 2:
+            raise ValueError("Invalid cursor")
+        last_value, last_id = last
+        op = "$lt" if descending else "$gt"
+        query["$and"] = query.get("$and", []) + [{
+            "$or": [
+                {sort_field: {op: last_value}},
+                {sort_field: last_value, "_id": {op: last_id}},
+            ]
+        }]
+
+    direction = -1 if descending else 1
+    docs = list(
+        collection.find(query, projection)
+        .sort([(sort_field, direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1].get(sort_field), docs[-1]["_id"])
+
+    return docs, next_cursor
+
 
 @app.route("/", methods=["GET", "POST"])
+@cache_anonymous_page
 def home():
     
     token_receive = request.cookies.get("mytoken")
-    menus = list(db.menu.find({}, {"_id": False}))
+    menus = get_all_menus()
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+            user_info = get_current_user()
             if user_info['profile_image'] == None:
                 user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
             if not user_info:
                 return redirect(url_for("login"))
-            for i in menus:
-                i["harga"] = formatted_currency(int(i["harga"]))
-            menus = menus[:3]
+            menus = format_field(menus[:3], "harga")
             return render_template(
                 "index.html", user_info=user_info, menus=menus
             )
 
         except jwt.ExpiredSignatureError:
             return
-    for i in menus:
-        i["harga"] = formatted_currency(int(i["harga"]))
-    menus = menus[:3]
+    menus = format_field(menus[:3], "harga")
     return render_template("index.html", menus=menus)
 
 
 @app.route("/about/", methods=["GET", "POST"])
+@cache_anonymous_page
 def about():
     
     token_receive = request.cookies.get("mytoken")
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+            user_info = get_current_user()
             if user_info['profile_image'] == None:
                 user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
             if not user_info:
@@ -105,6 +613,7 @@ def about():
 
 
 @app.route("/contact/", methods=["GET", "POST"])
+@cache_anonymous_page
 def contact():
     token_receive = request.cookies.get("mytoken")
 
@@ -142,8 +651,7 @@ def contact():
     
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+            user_info = get_current_user()
             if user_info['profile_image'] == None:
                 user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
             if not user_info:
@@ -161,96 +669,301 @@ def contact():
 
 
 @app.route("/menu/", methods=["GET"])
+@cache_anonymous_page
 def menu():
-    category = request.args.get("category")
-    if category:
-        menus = list(db.menu.find({"kategori": category}, {"_id": False}))
-    else:
-        menus = list(db.menu.find({}, {"_id": False}))
-
-    for item in menus:
-        total_ratings = sum([item.get("rating_" + str(i), 0) * i for i in range(1, 6)])
-        total_reviews = sum([item.get("rating_" + str(i), 0) for i in range(1, 6)])
-        item["average_rating"] = (
-            total_ratings / total_reviews if total_reviews > 0 else 0
-        )
-        
+    # grid menu diisi oleh JS dari /filter_menu per halaman
     token_receive = request.cookies.get("mytoken")
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+            user_info = get_current_user()
             if user_info['profile_image'] == None:
                 user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
             if not user_info:
                 return redirect(url_for("login"))
             return render_template(
-                "menu.html", user_info=user_info,menus=menus
+                "menu.html", user_info=user_info
             )
 
         except jwt.ExpiredSignatureError:
             return
    
-    return render_template("menu.html", menus=menus)
+    return render_template("menu.html")
 
 
 @app.route("/filter_menu", methods=["GET"])
 def filter_menu():
-    category = request.args.get("category")
-    if category:
-        menus = list(db.menu.find({"kategori": category}, {"_id": False}))
+    sort = request.args.get("sort", "sold")
+    if sort not in MENU_SORT_KEYS:
+        return jsonify({"error": "Invalid sort, use one of: " + ", ".join(MENU_SORT_KEYS)}), 400
+    order = request.args.get("order")
+    try:
+        menus, next_cursor = menu_page(
+            category=request.args.get("category"),
+            sort=sort,
+            descending=None if order not in ("asc", "desc") else order == "desc",
+            cursor=request.args.get("cursor"),
+            limit=min(max(request.args.get("limit", MENU_PAGE_SIZE, type=int), 1), 100),
+            min_rating=request.args.get("min_rating", type=float),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"menus": menus, "next_cursor": next_cursor})
+
+
+# ===================================== MENU LISTING =====================================
+# /filter_menu mengembalikan satu halaman berisi field yang dipakai kartu grid saja.
+# Halaman dipotong dengan keyset (nilai sort + menuId) di atas urutan katalog yang sudah
+# di-sort sekali per katalog, jadi ukuran response dan biaya per halaman tidak ikut
+# membesar bersama jumlah menu. Sort dilakukan di memori karena harga disimpan sebagai string.
+MENU_PAGE_SIZE = 12
+MENU_CARD_FIELDS = ("menuId", "nama", "harga", "image", "image_variants", "average_rating", "sold")
+# nama sort -> (key, default descending, tipe nilai key yang boleh ada di cursor)
+MENU_SORT_KEYS = {
+    "sold": (lambda item: int(item.get("sold") or 0), True, (int,)),
+    "price": (lambda item: int(item.get("harga") or 0), False, (int,)),
+    "name": (lambda item: (item.get("nama") or "").casefold(), False, (str,)),
+    "rating": (lambda item: item.get("average_rating") or 0, True, (int, float)),
+}
+
+
+def menu_card(item):
+    card = {field: item.get(field) for field in MENU_CARD_FIELDS}
+    card["average_rating"] = card["average_rating"] or 0
+    return card
+
+
+def menu_ordering(catalog, category, sort):
+    key = (category, sort)
+    ordering = catalog["orderings"].get(key)
+    if ordering is None:
+        items = catalog["by_kategori"].get(category, []) if category else catalog["items"]
+        sort_key = MENU_SORT_KEYS[sort][0]
+        ordering = sorted((sort_key(item), item["menuId"]) for item in items)
+        catalog["orderings"][key] = ordering
+    return ordering
+
+
+def decode_menu_cursor(cursor, sort):
+    """Nilai (key, menuId) dari cursor /filter_menu. ValueError kalau cursor bukan untuk sort ini."""
+    last = decode_cursor(cursor)
+    # cursor berisi nama sort, jadi cursor dari sort lain tidak dibandingkan dengan urutan yang salah
+    if not isinstance(last, list) or len(last) != 3 or last[0] != sort:
+        raise ValueError("Invalid cursor for sort " + sort)
+    _, value, menu_id = last
+    if isinstance(value, bool) or not isinstance(value, MENU_SORT_KEYS[sort][2]) or not isinstance(menu_id, str):
+        raise ValueError("Invalid cursor for sort " + sort)
+    return value, menu_id
+
+
+def menu_page(category=None, sort="sold", descending=None, cursor=None, limit=MENU_PAGE_SIZE, min_rating=None):
+    """Satu halaman kartu menu dan cursor halaman berikutnya. ValueError kalau cursor tidak valid."""
+    catalog = load_menu_catalog()
+    if descending is None:
+        descending = MENU_SORT_KEYS[sort][1]
+    ordering = menu_ordering(catalog, category, sort)
+
+    if cursor:
+        last = decode_menu_cursor(cursor, sort)
+        start = bisect_left(ordering, last) - 1 if descending else bisect_right(ordering, last)
     else:
-        menus = list(db.menu.find({}, {"_id": False}))
+        start = len(ordering) - 1 if descending else 0
+    step = -1 if descending else 1
+
+    menus = []
+    index = start
+    while 0 <= index < len(ordering) and len(menus) <= limit:
+        item = catalog["by_id"][ordering[index][1]]
+        if not min_rating or (item.get("average_rating") or 0) >= min_rating:
+            menus.append((ordering[index], item))
+        index += step
+
+    next_cursor = None
+    if len(menus) > limit:
+        menus = menus[:limit]
+        next_cursor = encode_cursor(sort, *menus[-1][0])
+    return [menu_card(item) for _, item in menus], next_cursor
+
+
+# index pencarian per worker, di-sync dari katalog setiap kali katalog di-load ulang
+menu_search_index = MenuSearchIndex()
+MENU_SEARCH_LIMIT = 20
+
 
-    for item in menus:
-        total_ratings = sum([item.get("rating_{}".format(i), 0) * i for i in range(1, 6)])
-        total_reviews = sum([item.get("rating_{}".format(i), 0) for i in range(1, 6)])
+def search_menus(query, limit=MENU_SEARCH_LIMIT):
+    catalog = load_menu_catalog()
+    menu_search_index.sync(catalog["items"], (catalog["version"], catalog["generation"]))
+    by_id = catalog["by_id"]
+    return [dict(by_id[menu_id]) for menu_id in menu_search_index.search(query, limit) if menu_id in by_id]
+
+
+@app.route("/search_menu", methods=["GET"])
+def search_menu():
+    query = request.args.get("q", "")
+    limit = min(max(request.args.get("limit", MENU_SEARCH_LIMIT, type=int), 1), 100)
+    return jsonify([menu_card(item) for item in search_menus(query, limit)])
+
+
+@app.route("/api/menu/suggest", methods=["GET"])
+def suggest_menu():
+    menus = search_menus(request.args.get("q", ""), 8)
+    return jsonify([{"menuId": item["menuId"], "nama": item["nama"]} for item in menus])
+
+
+def get_menu_items(menu_ids, fresh=False):
+    # fresh=True (checkout) selalu membaca harga dari Mongo, bukan dari katalog cache
+    by_id = {} if fresh else load_menu_catalog()["by_id"]
+    menu_items = {}
+    missing = []
+    for menu_id in set(menu_ids):
+        if menu_id in by_id:
+            menu_items[menu_id] = dict(by_id[menu_id])
+        else:
+            missing.append(menu_id)
+    if missing:
+        for item in find_profile("menu", {"menuId": {"$in": missing}}, "cart-line"):
+            menu_items[item["menuId"]] = item
+    return menu_items
 
-        item["average_rating"] = (
-            total_ratings / total_reviews if total_reviews > 0 else 0
+
+# ===================================== CART =====================================
+# Semua perubahan cart dijalankan sebagai update atomik di Mongo ($inc dengan arrayFilters,
+# $push bersyarat, $pull), bukan baca-ubah-tulis seluruh array. Dengan CART_COLLECTION=carts
+# cart disimpan di koleksi "carts" ({"email", "items"}) supaya dokumen users tidak ikut ditulis.
+# Sebelum mengaktifkan CART_COLLECTION=carts, pindahkan cart lama dengan: flask --app app migrate-carts
+CART_COLLECTION = os.environ.get("CART_COLLECTION", "users")
+
+
+def cart_location(email):
+    if CART_COLLECTION == "carts":
+        return db.carts, {"email": email}, "items"
+    return db.users, {"email": email}, "cart"
+
+
+def get_cart(email):
+    collection, query, field = cart_location(email)
+    if CART_COLLECTION == "carts":
+        doc = collection.find_one(query, {"_id": False, field: True})
+    else:
+        doc = find_one_profile("users", query, "cart")
+    return (doc or {}).get(field) or []
+
+
+def add_cart_item(email, cart_item):
+    """Tambah item ke cart, False kalau tidak ada dokumen yang berubah (misalnya user tidak ada)."""
+    collection, query, field = cart_location(email)
+    line = {
+        "menuId": cart_item["menuId"],
+        "option1": cart_item["option1"],
+        "option2": cart_item["option2"],
+    }
+    # coba tambah quantity baris yang sama dulu; kalau belum ada, push baris baru hanya jika
+    # baris itu memang belum ada (bisa saja request lain baru saja menambahkannya)
+    for _ in range(3):
+        result = collection.update_one(
+            {**query, field: {"$elemMatch": line}},
+            {"$inc": {field + ".$[line].quantity": cart_item["quantity"]}},
+            array_filters=[{"line." + key: value for key, value in line.items()}],
         )
+        if result.modified_count:
+            return True
+
+        try:
+            result = collection.update_one(
+                {**query, field: {"$not": {"$elemMatch": line}}},
+                {"$push": {field: cart_item}},
+                upsert=CART_COLLECTION == "carts",
+            )
+        except DuplicateKeyError:
+            continue
+        if result.modified_count or result.upserted_id:
+            return True
+    return False
+
+
+def set_cart_quantity(email, menu_id, quantity):
+    collection, query, field = cart_location(email)
+    doc = collection.find_one_and_update(
+        {**query, field + ".menuId": menu_id},
+        {"$set": {field + ".$.quantity": quantity}},
+        projection={"_id": False, field: True},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        return get_cart(email)
+    return doc.get(field) or []
 
-    return jsonify(menus)
 
+def remove_cart_items(email, item_ids):
+    collection, query, field = cart_location(email)
+    collection.update_one(query, {"$pull": {field: {"item_id": {"$in": item_ids}}}})
 
-def get_menu_item(menu_id):
-    return db.menu.find_one({"menuId": menu_id})
+
+def move_cart(old_email, new_email):
+    if CART_COLLECTION == "carts" and old_email != new_email:
+        db.carts.update_one({"email": old_email}, {"$set": {"email": new_email}})
+
+
+CartPricing = namedtuple(
+    "CartPricing",
+    ["items", "line_totals", "total_price", "discount", "tax", "final_total_price"],
+)
+
+
+def formatted_totals_of(pricing):
+    total_price, discount, tax, final_total_price = formatted_currency_many(
+        [pricing.total_price, pricing.discount, pricing.tax, pricing.final_total_price]
+    )
+    return {
+        "total_price": total_price,
+        "discount": discount,
+        "tax": tax,
+        "final_total_price": final_total_price,
+    }
+
+
+def price_cart(cart_items, discount=0, fresh=False):
+    # semua menuId di cart diambil sekaligus (dari cache katalog atau satu query $in)
+    menu_items = get_menu_items((item["menuId"] for item in cart_items), fresh=fresh)
+
+    total_price = 0
+    line_totals = []
+    for item in cart_items:
+        menu_item = menu_items.get(item["menuId"], {})
+        item["image"] = menu_item.get("image", "")
+        item["name"] = menu_item.get("nama", "")
+        item["price"] = int(menu_item.get("harga", 0))
+        item_total = item["price"] * item["quantity"]
+        line_totals.append(item_total)
+        total_price += item_total
+
+    tax = int(total_price * 0.10)
+    final_total_price = total_price - discount + tax
+
+    return CartPricing(
+        items=cart_items,
+        line_totals=line_totals,
+        total_price=total_price,
+        discount=discount,
+        tax=tax,
+        final_total_price=final_total_price,
+    )
 
 
 @app.route("/cart/", methods=["GET", "POST"])
 def cart():
-    token_receive = request.cookies.get("mytoken")
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]})
-        menu = db.menu.find({}, {"_id": False})
-        menu = menu[:4]
-
-        formatted_menu = []
-        for item in menu:
-            item["harga"] = formatted_currency(int(item["harga"]))
-            formatted_menu.append(item)
-
-        cart_items = user_info.get("cart", [])
-
-        total_price = 0
-        for item in cart_items:
-            menu_item = get_menu_item(item["menuId"])
-            item["image"] = menu_item["image"]
-            item["name"] = menu_item["nama"]
-            item["price"] = int(menu_item["harga"])
-            item_total = item["price"] * item["quantity"]
-            total_price += item_total
-
-        discount = 0
-        tax = int(total_price * 0.10)
-        final_total_price = total_price - discount + tax
+        user_info = get_current_user()
+        menu = get_all_menus()[:4]
+
+        formatted_menu = format_field(menu, "harga")
 
+        pricing = price_cart(get_cart(user_info["email"]))
+
+        formatted_totals = formatted_currency_many(pricing.line_totals)
         formatted_cart_items = []
-        for item in cart_items:
-            item["formatted_price"] = formatted_currency(item["price"])
-            item["formatted_total"] = formatted_currency(item["price"] * item["quantity"])
-            
+        for item, formatted_total in zip(format_field(pricing.items, "price", "formatted_price"), formatted_totals):
+            item["formatted_total"] = formatted_total
+
             if isinstance(item["option2"], list):
                 item["option2"] = ", ".join(item["option2"])
             formatted_cart_items.append(item)
@@ -261,10 +974,7 @@ def cart():
             user_info=user_info,
             cart_items=formatted_cart_items,
           
-            total_price=formatted_currency(total_price),
-            discount=formatted_currency(discount),
-            tax=formatted_currency(tax),
-            final_total_price=formatted_currency(final_total_price)
+            **formatted_totals_of(pricing)
         )
     except jwt.ExpiredSignatureError:
         return redirect(url_for("login", msg="Your token has expired"))
@@ -278,36 +988,21 @@ def update_quantity():
     menu_id = data.get("menu_id")
     new_quantity = data.get("quantity")
 
-    token_receive = request.cookies.get("mytoken")
-    payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-    user_info = db.users.find_one({"email": payload["id"]})
+    user_email = get_current_email()
+
+    pricing = price_cart(set_cart_quantity(user_email, menu_id, new_quantity))
 
-    for item in user_info["cart"]:
+    updated_item_price = 0
+    updated_total = 0
+    for item, item_total in zip(pricing.items, pricing.line_totals):
         if item["menuId"] == menu_id:
-            item["quantity"] = new_quantity
+            updated_item_price = item["price"]
+            updated_total = item_total
             break
 
-    db.users.update_one({"email": payload["id"]}, {"$set": {"cart": user_info["cart"]}})
-
-    total_price = sum(
-        int(get_menu_item(item["menuId"])["harga"]) * item["quantity"]
-        for item in user_info["cart"]
-    )
-    discount = 0
-    tax = int(total_price * 0.10)
-    final_total_price = total_price - discount + tax
-
-    updated_item_price = int(get_menu_item(menu_id)["harga"])
-    updated_total = new_quantity * updated_item_price
-
-    response_data = {
-      "total_price": "Rp. {:,}".format(total_price).replace(",", "."),
-      "discount": "Rp. {:,}".format(discount).replace(",", "."),
-      "tax": "Rp. {:,}".format(tax).replace(",", "."),
-      "final_total_price": "Rp. {:,}".format(final_total_price).replace(",", "."),
-      "formatted_total": "Rp. {:,}".format(updated_total).replace(",", "."),
-      "formatted_price": "Rp. {:,}".format(updated_item_price).replace(",", "."),
-      }
+    response_data = formatted_totals_of(pricing)
+    response_data["formatted_total"] = formatted_currency(updated_total)
+    response_data["formatted_price"] = formatted_currency(updated_item_price)
 
     return jsonify(response_data)
 
@@ -319,8 +1014,7 @@ def profile():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user(profile="profile")
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -329,19 +1023,20 @@ def profile():
         if user_info.get('profile_image') is None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
 
-
-        order_history = list(
-            db.orders.find({"user_email": user_info["email"]}, {"_id": False})
+        # profil hanya menampilkan ringkasan order terbaru, riwayat lengkap ada di /order_history
+        recent_orders, _ = find_page(
+            db.orders,
+            {"user_email": user_info["email"]},
+            "timestamp",
+            limit=PROFILE_RECENT_ORDERS,
+            projection=ORDER_SUMMARY_FIELDS,
         )
-        
-        for order in order_history:
-            order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-            for item in order["order_items"]:
-                if isinstance(item["option2"], list):
-                    item["option2"] = ", ".join(item["option2"])
+        for order in recent_orders:
+            order.pop("_id")
+            order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M")
 
         return render_template(
-            "profile.html", user_info=user_info, order_history=order_history
+            "profile.html", user_info=user_info, recent_orders=recent_orders
         )
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
@@ -354,30 +1049,154 @@ def order_history():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
             return redirect(url_for("login"))
 
-        order_history = list(
-            db.orders.find({"user_email": user_info["email"]}, {"_id": False})
-        )
-        
-        for order in order_history:
-            order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-            for item in order["order_items"]:
-                if isinstance(item["option2"], list):
-                    item["option2"] = ", ".join(item["option2"])
+        order_history, next_cursor = get_order_history_page(user_info["email"])
 
         return render_template(
-            "order-history.html", user_info=user_info, order_history=order_history
+            "order-history.html",
+            user_info=user_info,
+            order_history=order_history,
+            next_cursor=next_cursor,
         )
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
         return redirect(url_for("login"))
-    
+
+
+# ===================================== ORDER HISTORY =====================================
+# Riwayat order customer diambil per halaman (terbaru dulu) dengan keyset di index
+# (user_email, timestamp, _id); halaman berikutnya dimuat order-history.html lewat JSON.
+ORDER_HISTORY_PAGE_SIZE = 10
+PROFILE_RECENT_ORDERS = 3
+ORDER_SUMMARY_FIELDS = {"order_id": True, "timestamp": True, "status": True, "total_price": True}
+ORDER_HISTORY_FIELDS = {**ORDER_SUMMARY_FIELDS, "order_items": True}
+
+
+def get_order_history_page(email, cursor=None, limit=ORDER_HISTORY_PAGE_SIZE):
+    orders, next_cursor = find_page(
+        db.orders,
+        {"user_email": email},
+        "timestamp",
+        cursor=cursor,
+        limit=limit,
+        projection=ORDER_HISTORY_FIELDS,
+    )
+    for order in orders:
+        order.pop("_id")
+        order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+        for item in order["order_items"]:
+            if isinstance(item["option2"], list):
+                item["option2"] = ", ".join(item["option2"])
+    return orders, next_cursor
+
+
+@app.route("/api/order_history", methods=["GET"])
+def api_order_history():
+    try:
+        email = get_current_email()
+    except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = min(max(request.args.get("limit", ORDER_HISTORY_PAGE_SIZE, type=int), 1), 50)
+    try:
+        orders, next_cursor = get_order_history_page(email, request.args.get("cursor"), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"orders": orders, "next_cursor": next_cursor})
+
+
+# ===================================== ORDER VIEW CACHE =====================================
+# HTML receipt dan bill tidak bergantung pada user yang membuka, jadi hasil render disimpan
+# per (template, order_id, status). Status dibaca dulu lewat query kecil, sehingga perubahan
+# status dari worker lain otomatis memakai key baru. Order COMPLETED tidak berubah lagi dan
+# dikirim dengan Cache-Control panjang; semua response diberi ETag supaya bisa dijawab 304.
+ORDER_VIEW_CACHE_MAX_ENTRIES = 512
+ORDER_VIEW_MAX_AGE = 24 * 60 * 60
+ORDER_FINAL_STATUSES = {"COMPLETED"}
+
+order_view_lock = threading.Lock()
+order_view_cache = OrderedDict()
+order_view_stats = {"hits": 0, "misses": 0}
+
+
+def load_order_for_view(order_id):
+    order = db.orders.find_one({"order_id": order_id}, {"_id": False})
+    if not order:
+        return None
+    order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+    for item in order["order_items"]:
+        if isinstance(item["option2"], list):
+            item["option2"] = ", ".join(item["option2"])
+    return order
+
+
+def get_order_view(template, order_id):
+    stamp = db.orders.find_one({"order_id": order_id}, {"_id": False, "status": True})
+    if not stamp:
+        return None
+
+    key = (template, order_id, stamp.get("status"))
+    with order_view_lock:
+        entry = order_view_cache.get(key)
+        if entry is not None:
+            order_view_cache.move_to_end(key)
+            order_view_stats["hits"] += 1
+            return entry
+
+    order = load_order_for_view(order_id)
+    if not order:
+        return None
+    body = render_template(template, order=order).encode("utf-8")
+    entry = {
+        "body": body,
+        "status": order.get("status"),
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+    }
+    with order_view_lock:
+        order_view_stats["misses"] += 1
+        # status bisa berubah di antara dua query, jadi simpan sesuai status yang dirender
+        order_view_cache[(template, order_id, entry["status"])] = entry
+        while len(order_view_cache) > ORDER_VIEW_CACHE_MAX_ENTRIES:
+            order_view_cache.popitem(last=False)
+    return entry
+
+
+def invalidate_order_views(order_id):
+    with order_view_lock:
+        for key in [key for key in order_view_cache if key[1] == order_id]:
+            del order_view_cache[key]
+
+
+def order_cache_headers(response, status, etag):
+    response.set_etag(etag)
+    if status in ORDER_FINAL_STATUSES:
+        response.headers["Cache-Control"] = "private, max-age={}".format(ORDER_VIEW_MAX_AGE)
+    else:
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+def order_view_response(entry):
+    response = make_response(entry["body"])
+    response.mimetype = "text/html"
+    return order_cache_headers(response, entry["status"], entry["etag"])
+
+
+def order_view_cache_stats():
+    with order_view_lock:
+        return {
+            "entries": len(order_view_cache),
+            "bytes": sum(len(entry["body"]) for entry in order_view_cache.values()),
+            "hits": order_view_stats["hits"],
+            "misses": order_view_stats["misses"],
+        }
+
+
 # route for view receipt
 @app.route("/view_receipt/<int:order_id>", methods=["GET", "POST"])
 def view_receipt(order_id):
@@ -386,27 +1205,19 @@ def view_receipt(order_id):
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
             return redirect(url_for("login"))
 
         print(f"Order ID received: {order_id}")
-        order = db.orders.find_one({"order_id": order_id}, {"_id": False})
-        if not order:
+        entry = get_order_view("view-receipt.html", order_id)
+        if entry is None:
             print("Order not found")
             return "Order not found", 404
 
-        order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-        for item in order["order_items"]:
-            if isinstance(item["option2"], list):
-                item["option2"] = ", ".join(item["option2"])
-
-        return render_template(
-            "view-receipt.html", user_info=user_info, order=order
-        )
+        return order_view_response(entry)
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
         return redirect(url_for("login"))
@@ -418,37 +1229,32 @@ def download_receipt(order_id):
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
             return redirect(url_for("login"))
 
         print(f"Order ID received: {order_id}")
-        order = db.orders.find_one({"order_id": order_id}, {"_id": False})
+        order = load_order_for_view(order_id)
         if not order:
             print("Order not found")
             return "Order not found", 404
 
-        order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-        for item in order["order_items"]:
-            if isinstance(item["option2"], list):
-                item["option2"] = ", ".join(item["option2"])
-
-        rendered = render_template("view-receipt-pdf.html", user_info=user_info, order=order)
-
-        # Use PDFCrowd API to generate PDF
-        client = pdfcrowd.HtmlToPdfClient(API_USERNAME, API_KEY)
-        pdf = client.convertString(rendered)
+        pdf = render_receipt(
+            order_id,
+            order,
+            lambda: render_template("view-receipt-pdf.html", user_info=user_info, order=order),
+            base_url=request.host_url,
+        )
 
         response = make_response(pdf)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = 'attachment; filename=receipt.pdf'
 
-        return response
+        return order_cache_headers(response, order["status"], hashlib.sha256(pdf).hexdigest()[:32])
 
-    except pdfcrowd.Error as why:
+    except ReceiptRenderError as why:
         return jsonify({"error": str(why)}), 500
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
@@ -462,27 +1268,19 @@ def view_bill(order_id):
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
             return redirect(url_for("login"))
 
         print(f"Order ID received: {order_id}")
-        order = db.orders.find_one({"order_id": order_id}, {"_id": False})
-        if not order:
+        entry = get_order_view("view-bill.html", order_id)
+        if entry is None:
             print("Order not found")
             return "Order not found", 404
 
-        order["timestamp"] = order["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-        for item in order["order_items"]:
-            if isinstance(item["option2"], list):
-                item["option2"] = ", ".join(item["option2"])
-
-        return render_template(
-            "view-bill.html", user_info=user_info, order=order
-        )
+        return order_view_response(entry)
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
         return redirect(url_for("login"))
@@ -498,8 +1296,7 @@ def check_review():
         return jsonify({"message": "Login required to check review"})
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
 
         if not user_info:
             return jsonify({"message": "User not found"})
@@ -529,8 +1326,7 @@ def submit_review():
         return jsonify({"message": "Login required to submit a review"})
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
 
         if not user_info:
             return jsonify({"message": "User not found"})
@@ -564,8 +1360,21 @@ def submit_review():
 
         db.reviews.insert_one(review_doc)
 
+        # update pipeline supaya counter dan average_rating berubah dalam satu operasi atomik
         rating_field = "rating_" + str(rating)
-        db.menu.update_one({"menuId": item_id}, {"$inc": {rating_field: 1}})
+        db.menu.update_one(
+            {"menuId": item_id},
+            [
+                {
+                    "$set": {
+                        rating_field: {"$add": [{"$ifNull": ["$" + rating_field, 0]}, 1]},
+                        "rating_count": {"$add": [{"$ifNull": ["$rating_count", 0]}, 1]},
+                        "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, rating]},
+                    }
+                },
+                {"$set": {"average_rating": {"$divide": ["$rating_sum", "$rating_count"]}}},
+            ],
+        )
 
         return redirect(url_for("order_history"))
 
@@ -573,6 +1382,47 @@ def submit_review():
         return jsonify({"message": "Invalid token"})
 
 
+# ===================================== ORDER ID =====================================
+# Nomor order diambil dari dokumen counter (find_one_and_update + $inc), jadi tetap unik
+# walaupun checkout berjalan paralel atau ada order yang dihapus. Dengan ORDER_ID_BLOCK_SIZE > 1
+# tiap worker memesan satu blok nomor sekaligus dan membagikannya tanpa round trip.
+ORDER_ID_BLOCK_SIZE = int(os.environ.get("ORDER_ID_BLOCK_SIZE", 1))
+
+order_id_lock = threading.Lock()
+order_id_block = {"next": 0, "last": -1, "seeded": False}
+
+
+def seed_order_counter():
+    # counter dimulai dari order_id terbesar yang sudah ada (data lama pakai count_documents()+1)
+    last_order = db.orders.find_one({}, {"order_id": True}, sort=[("order_id", -1)])
+    db.counters.update_one(
+        {"_id": "order_id"},
+        {"$max": {"seq": last_order["order_id"] if last_order else 0}},
+        upsert=True,
+    )
+
+
+def next_order_id():
+    with order_id_lock:
+        if not order_id_block["seeded"]:
+            seed_order_counter()
+            order_id_block["seeded"] = True
+
+        if order_id_block["next"] > order_id_block["last"]:
+            counter = db.counters.find_one_and_update(
+                {"_id": "order_id"},
+                {"$inc": {"seq": ORDER_ID_BLOCK_SIZE}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            order_id_block["last"] = counter["seq"]
+            order_id_block["next"] = counter["seq"] - ORDER_ID_BLOCK_SIZE + 1
+
+        order_id = order_id_block["next"]
+        order_id_block["next"] += 1
+        return order_id
+
+
 @app.route("/confirm_purchase", methods=["POST"])
 def confirm_purchase():
     token_receive = request.cookies.get("mytoken")
@@ -580,23 +1430,13 @@ def confirm_purchase():
         return jsonify({"success": False, "message": "User not logged in"})
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_email = payload["id"]
+        user_email = get_current_email()
 
-        user = db.users.find_one({"email": user_email})
-        cart_items = user.get("cart", [])
+        pricing = price_cart(get_cart(user_email), fresh=True)
+        cart_items = pricing.items
+        total_price = pricing.total_price
 
-        total_price = 0
-        for item in cart_items:
-            menu_item = get_menu_item(item["menuId"])
-            item["image"] = menu_item.get("image", "")
-            item["name"] = menu_item.get("nama", "")
-            item["price"] = int(menu_item.get("harga", 0))
-            total_price += item["price"] * item["quantity"]
-
-          
-
-        order_id = db.orders.count_documents({}) + 1
+        order_id = next_order_id()
 
         order = {
             "order_id": order_id,
@@ -608,12 +1448,15 @@ def confirm_purchase():
         }
 
         db.orders.insert_one(order)
+        record_daily_sales(order["timestamp"], total_price)
       
-        for i in cart_items:
-            db.menu.update_one(
-                {"menuId": i["menuId"]}, {"$inc": {"sold": +i["quantity"]}}
-            )
-        db.users.update_one({"email": user_email}, {"$set": {"cart": []}})
+        if cart_items:
+            db.menu.bulk_write([
+                UpdateOne({"menuId": i["menuId"]}, {"$inc": {"sold": +i["quantity"]}})
+                for i in cart_items
+            ])
+        # hanya baris yang sudah dipesan yang dihapus, item yang baru masuk tetap di cart
+        remove_cart_items(user_email, [i["item_id"] for i in cart_items])
 
         return jsonify(
             {"success": True, "message": "Purchase confirmed and cart cleared"}
@@ -631,18 +1474,11 @@ def confirm_purchase():
 
 @app.route("/remove_item", methods=["POST"])
 def remove_item():
-    token_receive = request.cookies.get("mytoken")
     item_id = request.form.get("item_id") 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_email = payload["id"]
+        user_email = get_current_email()
 
-        db.users.update_one(
-            {"email": user_email},
-            {
-                "$pull": {"cart": {"item_id": item_id}}
-            }, 
-        )
+        remove_cart_items(user_email, [item_id])
 
         return jsonify({"success": True, "message": "Item removed successfully"})
     except jwt.ExpiredSignatureError:
@@ -657,36 +1493,24 @@ def remove_item():
 
 @app.route("/apply_voucher", methods=["POST"])
 def apply_voucher():
-    token_receive = request.cookies.get("mytoken")
     voucher_code = request.form.get("voucher_code")
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]})
-        cart_items = user_info.get("cart", [])
-
-        total_price = 0
-        for item in cart_items:
-            menu_item = get_menu_item(item["menuId"])
-            item["name"] = menu_item["nama"]
-            item["price"] = int(menu_item["harga"])
-            item_total = item["price"] * item["quantity"]
-            total_price += item_total
-
+        user_email = get_current_email()
         voucher = db.vouchers.find_one({"code": voucher_code})
         if voucher and voucher["is_valid"]:
             discount = int(voucher["discount"])
         else:
             discount = 0
 
-        tax = total_price * 0.10
-        final_total_price = total_price - discount + tax
+        pricing = price_cart(get_cart(user_email), discount=discount)
 
         return jsonify(
             {
-                "total_price": total_price,
-                "discount": discount,
-                "tax": tax,
-                "final_total_price": final_total_price,
+                "total_price": pricing.total_price,
+                "discount": pricing.discount,
+                "tax": pricing.tax,
+                "final_total_price": pricing.final_total_price,
+                "formatted": formatted_totals_of(pricing),
                 "success": True if discount > 0 else False,
                 "message": (
                     "Voucher applied successfully"
@@ -710,8 +1534,7 @@ def add_to_cart():
         return jsonify({"success": False, "message": "User not logged in"})
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_email = get_current_email()
 
         menuId = request.form.get("menuId")
         quantity = int(request.form.get("quantity"))  
@@ -725,27 +1548,9 @@ def add_to_cart():
             "option1": option1,
             "option2": option2,
         }
-    
-        if not user_info.get("cart"):
-            user_info["cart"] = []
-
-        item_exists = False
-        for item in user_info["cart"]:
-            if (
-                item["menuId"] == menuId
-                and item["option1"] == option1
-                and item["option2"] == option2
-            ):
-                item["quantity"] += quantity
-                item_exists = True
-                break
-
-        if not item_exists:
-            user_info["cart"].append(cart_item)
-
-        db.users.update_one(
-            {"email": payload["id"]}, {"$set": {"cart": user_info["cart"]}}
-        )
+
+        if not add_cart_item(user_email, cart_item):
+            return jsonify({"success": False, "message": "Failed to add item to cart"})
 
         return jsonify({"success": True})
 
@@ -761,42 +1566,24 @@ def product(menuId):
     user_info = None
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+            user_info = get_current_user()
         except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
             pass
 
-    menu_item = db.menu.find_one({"menuId": menuId}, {"_id": False})
-    
-    menu_item['harga'] = formatted_currency(int(menu_item['harga']))
-  
+    menu_item = get_menu_by_id(menuId)
 
     if not menu_item:
         return "Menu item not found"
 
-    similar_menu = list(
-        db.menu.find({"kategori": {"$in": menu_item["kategori"]}}, {"_id": False})
-    )
+    menu_item['harga'] = formatted_currency(int(menu_item['harga']))
+
+    similar_menu = format_field(get_menus_by_kategori(menu_item["kategori"]), "harga")
     for item in similar_menu:
-        total_ratings = sum([item.get("rating_{}".format(i), 0) * i for i in range(1, 6)])
-        total_reviews = sum([item.get("rating_{}".format(i), 0) for i in range(1, 6)])
-        
-        item["average_rating"] = (
-            total_ratings / total_reviews if total_reviews > 0 else 0
-        )
-        item["harga"] = formatted_currency(int(item["harga"]))
+        item.setdefault("average_rating", 0)
 
-    reviews = list(db.reviews.find({"item_id": menuId}))
-    reviews_total = len(reviews)
-    for review in reviews:
-        user = db.users.find_one({"email": review["user_email"]}, {"_id": False})
-        if user:
-            review["user_name"] = user["user_name"]
-            review["profile_image"] = user["profile_image"]
-        else:
-            review["user_name"] = "Unknown User"
+    reviews, next_cursor = get_reviews_page(menuId)
 
-    total_reviews = sum(menu_item.get("rating_{}".format(i), 0) for i in range(1, 6))
+    total_reviews = menu_item.get("rating_count", 0)
 
     if total_reviews > 0:
         star_percentages = {}
@@ -808,12 +1595,7 @@ def product(menuId):
     else:
         star_percentages = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
 
-    if total_reviews > 0:
-        total_rating = sum(i * menu_item.get("rating_{}".format(i), 0) for i in range(1, 6))
-        average_rating = total_rating / total_reviews
-        average_rating = round(average_rating, 1)
-    else:
-        average_rating = 0
+    average_rating = round(menu_item.get("average_rating", 0), 1)
 
     similar_menu = similar_menu[:4]
     return render_template(
@@ -822,18 +1604,71 @@ def product(menuId):
         similar_menu=similar_menu,
         menu_item=menu_item,
         reviews=reviews,
+        next_cursor=next_cursor,
         star_percentages=star_percentages,
         average_rating=average_rating,
-        total_reviews=reviews_total,
+        total_reviews=total_reviews,
+    )
+
+
+REVIEWS_PAGE_SIZE = 10
+
+
+def get_reviews_page(menu_id, cursor=None, limit=REVIEWS_PAGE_SIZE):
+    # keyset (timestamp, _id) per item_id dilayani index reviews (item_id, timestamp, _id) di INDEXES
+    reviews, next_cursor = find_page(
+        db.reviews, {"item_id": menu_id}, "timestamp", cursor=cursor, limit=limit
+    )
+
+    # profil reviewer diambil sekaligus dalam satu query, bukan find_one per review
+    emails = list({review["user_email"] for review in reviews})
+    users = {
+        user["email"]: user
+        for user in find_profile("users", {"email": {"$in": emails}}, "reviewer")
+    }
+
+    page = []
+    for review in reviews:
+        user = users.get(review["user_email"])
+        page.append({
+            "user_name": user["user_name"] if user else "Unknown User",
+            "profile_image": user.get("profile_image") if user else None,
+            "rating": review["rating"],
+            "review_text": review["review_text"],
+            "timestamp": review["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    return page, next_cursor
+
+
+@app.route("/api/reviews/<menuId>", methods=["GET"])
+def api_reviews(menuId):
+    limit = min(request.args.get("limit", REVIEWS_PAGE_SIZE, type=int), 50)
+    try:
+        reviews, next_cursor = get_reviews_page(
+            menuId, cursor=request.args.get("cursor"), limit=max(limit, 1)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"reviews": reviews, "next_cursor": next_cursor})
+
+
+# foto profil di-upload di background, profile_image di-set setelah upload selesai
+def upload_profile_image(image_file, user_name, email):
+    submit_upload(
+        image_file,
+        upload_file_name(image_file, user_name),
+        db.users,
+        {"email": email},
+        "profile_image",
+        on_done=lambda url: invalidate_user_cache(email),
     )
 
 
 @app.route("/update_profile", methods=["POST"])
 def update_profile():
-    token_receive = request.cookies.get("mytoken")
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_email = payload["id"]
+        user_email = get_current_email()
         full_name = request.form.get("fullName")
         email = request.form.get("email")
         old_password = request.form.get("oldPassword")
@@ -843,30 +1678,8 @@ def update_profile():
         address = request.form.get("address")
         
         image_file = request.files.get('image_file')
-        if image_file:
-            filename = secure_filename(image_file.filename)
-            filename1 = secure_filename(full_name)
-            finalFilename = "{}.{}".format(filename1, filename.split('.')[-1])
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            image_file.save(filepath)
-            
-            try:
-                imagekit = ImageKit(
-                    private_key=PRIVATE_KEY_TOKEN_IMAGEKIT,
-                    public_key=PUBLIC_KEY_TOKEN_IMAGEKIT,
-                    url_endpoint='https://ik.imagekit.io/coffeeshopteam3'
-                )
-                response = imagekit.upload_file(
-                    file=open(filepath, 'rb'),
-                    file_name=finalFilename,
-                )
-                image_url = response.response_metadata.raw['url']
-                os.remove(filepath)
-            except Exception as e:
-                os.remove(filepath)
-                return jsonify({"message": "Error occurred while uploading image. " + str(e)})
         
-        user = db.users.find_one({"email": user_email})
+        user = get_current_user(fresh=True, profile="account")
         
         if old_password and new_password:
             old_password_hash = hashlib.sha256(old_password.encode("utf-8")).hexdigest()
@@ -887,6 +1700,10 @@ def update_profile():
                 )
             else:
                 return jsonify({"message": "Old password is incorrect."})
+            invalidate_user_cache(user_email, email)
+            move_cart(user_email, email)
+            if image_file:
+                upload_profile_image(image_file, full_name, email)
         else:
             db.users.update_one(
                 {"email": user_email},
@@ -908,6 +1725,10 @@ def update_profile():
                     }
                 }
             )
+            invalidate_user_cache(user_email, email)
+            move_cart(user_email, email)
+            if image_file:
+                upload_profile_image(image_file, full_name, email)
             new_payload = {
             "id": email,
             "exp": datetime.utcnow() + timedelta(seconds=60 * 60 * 24)
@@ -930,8 +1751,7 @@ def register():
     token_receive = request.cookies.get("mytoken")
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]})
+            user_info = get_current_user()
             if user_info:
                 return redirect(url_for("home"))
         except jwt.ExpiredSignatureError:
@@ -956,8 +1776,7 @@ def login():
  
     if token_receive:
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_info = db.users.find_one({"email": payload["id"]})
+            user_info = get_current_user()
             if user_info["role"] == "ADMIN":
                     return redirect(url_for("admin_dashboard"))
             else:
@@ -975,7 +1794,7 @@ def sign_up():
     name_receive = request.form["name_give"]
     email_receive = request.form["email_give"]
     password_receive = request.form["password_give"]
-    exist_user = db.users.find_one({"email": email_receive})
+    exist_user = find_one_profile("users", {"email": email_receive}, "exists")
     if exist_user is not None:
         return jsonify({"result": "fail", "message": "Email already exists"})
     
@@ -998,11 +1817,13 @@ def sign_in():
     password_receive = request.form["password_give"]
     pw_hash = hashlib.sha256(password_receive.encode("utf-8")).hexdigest()
     
-    result = db.users.find_one(
+    result = find_one_profile(
+        "users",
         {
             "email": email_receive,
             "password": pw_hash,
-        }
+        },
+        "auth",
     )
     
     if result:
@@ -1032,7 +1853,7 @@ def sign_in():
 def generate_menu_id(categories):
     initial_id = "".join([category[0].upper() for category in categories])
 
-    existing_ids = db.menu.find({"menuId": {"$regex": "^" + initial_id}})
+    existing_ids = find_profile("menu", {"menuId": {"$regex": "^" + initial_id}}, "ids")
 
 
     max_number = 0
@@ -1053,6 +1874,56 @@ def generate_menu_id(categories):
 
 
 
+@app.cli.command("backfill-ratings")
+def backfill_ratings():
+    """Hitung ulang rating_count, rating_sum dan average_rating dari field rating_1..rating_5."""
+    updates = []
+    for item in db.menu.find({}, {"menuId": True, **{"rating_{}".format(i): True for i in range(1, 6)}}):
+        rating_count = sum(item.get("rating_{}".format(i), 0) for i in range(1, 6))
+        rating_sum = sum(item.get("rating_{}".format(i), 0) * i for i in range(1, 6))
+        average_rating = rating_sum / rating_count if rating_count > 0 else 0
+        updates.append(
+            UpdateOne(
+                {"_id": item["_id"]},
+                {"$set": {
+                    "rating_count": rating_count,
+                    "rating_sum": rating_sum,
+                    "average_rating": average_rating,
+                }},
+            )
+        )
+
+    if updates:
+        db.menu.bulk_write(updates)
+    invalidate_menu_cache()
+    print(f"Backfilled ratings for {len(updates)} menu item(s)")
+
+
+@app.cli.command("migrate-carts")
+def migrate_carts():
+    """Pindahkan users.cart ke koleksi carts, dijalankan sebelum memakai CART_COLLECTION=carts."""
+    updates = []
+    emails = []
+    for user in db.users.find({"cart.0": {"$exists": True}}, {"_id": False, "email": True, "cart": True}):
+        # digabung ke cart yang mungkin sudah ada, jadi aman dijalankan ulang
+        updates.append(
+            UpdateOne(
+                {"email": user["email"]},
+                {"$push": {"items": {"$each": user["cart"]}}},
+                upsert=True,
+            )
+        )
+        emails.append(user["email"])
+
+    if updates:
+        db.carts.bulk_write(updates)
+        db.users.update_many({"email": {"$in": emails}}, {"$unset": {"cart": ""}})
+        invalidate_user_cache(*emails)
+    print(f"Migrated carts for {len(updates)} user(s)")
+
+
+
+
 # ===================================== ADMIN =====================================
 def admin_required(f):
     @wraps(f)
@@ -1062,9 +1933,7 @@ def admin_required(f):
             return redirect(url_for('login'))
 
         try:
-            payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-            user_email = payload["id"]
-            user = db.users.find_one({"email": user_email})
+            user = get_current_user()
             if user and user.get("role") == "ADMIN":
                 return f(*args, **kwargs)
             else:
@@ -1086,8 +1955,7 @@ def admin_dashboard():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1110,8 +1978,7 @@ def admin_user_list():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1127,16 +1994,13 @@ def admin_user_list():
 @app.route("/admin_update_menu/", methods=["GET", "POST"])
 @admin_required
 def admin_update_menu():
-    menus = list(db.menu.find({}, {"_id": False}))
-    for menu in menus:
-        menu["harga"] = formatted_currency(int(menu["harga"]))
+    menus = format_field(get_all_menus(), "harga")
     token_receive = request.cookies.get("mytoken")
     if not token_receive:
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1157,8 +2021,7 @@ def admin_add_product():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1179,8 +2042,7 @@ def admin_add_user():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1201,12 +2063,11 @@ def admin_edit_user(user_name):
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        admin_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        admin_info = get_current_user()
         if admin_info is None:
             return redirect(url_for("login"))
 
-        user_info = db.users.find_one({"user_name": user_name}, {"_id": False})
+        user_info = find_one_profile("users", {"user_name": user_name}, "profile")
         if user_info is None:
             return "User not found", 404
 
@@ -1224,10 +2085,8 @@ def admin_edit_user(user_name):
 @app.route("/admin_upload_edited_user_data", methods=["POST"])
 @admin_required
 def admin_upload_edited_user_data():
-    token_receive = request.cookies.get("mytoken")
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        admin_email = payload["id"]
+        admin_email = get_current_email()
 
         original_email = request.form.get("original_email")
         user_name = request.form.get("user_name")
@@ -1241,30 +2100,9 @@ def admin_upload_edited_user_data():
         print(f"Received original_email: {original_email}")
 
         image_file = request.files.get('image_file')
-        if image_file:
-            filename = secure_filename(image_file.filename)
-            finalFilename = "{}.{}".format(secure_filename(user_name), filename.split('.')[-1])
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            image_file.save(filepath)
-
-            try:
-                imagekit = ImageKit(
-                    private_key=PRIVATE_KEY_TOKEN_IMAGEKIT,
-                    public_key=PUBLIC_KEY_TOKEN_IMAGEKIT,
-                    url_endpoint='https://ik.imagekit.io/rn4jfgmjp'
-                )
-                response = imagekit.upload_file(
-                    file=open(filepath, 'rb'),
-                    file_name=finalFilename,
-                )
-                image_url = response.response_metadata.raw['url']
-                os.remove(filepath)
-            except Exception as e:
-                os.remove(filepath)
-                return jsonify({"message": "Error occurred while uploading image. " + str(e)})
 
         # Cek apakah user dengan original_email ada di database
-        user = db.users.find_one({"email": original_email})
+        user = find_one_profile("users", {"email": original_email}, "account")
         if user is None:
             print(f"User not found for email: {original_email}")
             return jsonify({"message": "User not found."})
@@ -1310,12 +2148,19 @@ def admin_upload_edited_user_data():
                 }
             }
         )
+        invalidate_user_cache(original_email, email)
+        move_cart(original_email, email)
+        if image_file:
+            upload_profile_image(image_file, user_name, email)
 
         return redirect(url_for("admin_user_list", user_name=user_name))
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError):
         return redirect(url_for("login"))
 
+FEEDBACKS_PAGE_SIZE = 20
+
+
 # admin to see all feedbacks
 @app.route("/admin_feedbacks/", methods=["GET", "POST"])
 @admin_required
@@ -1325,17 +2170,26 @@ def admin_feedbacks():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
             return redirect(url_for("login"))
 
-        feedbacks = list(db.feedbacks.find({}, {"_id": False}))
- 
+        # feedback terbaru dulu, per halaman (keyset di index feedbacks (timestamp, _id))
+        try:
+            feedbacks, next_cursor = find_page(
+                db.feedbacks, {}, "timestamp", cursor=request.args.get("cursor"), limit=FEEDBACKS_PAGE_SIZE
+            )
+        except ValueError:
+            return redirect(url_for("admin_feedbacks"))
+
         return render_template(
-            "admin_feedbacks.html", user_info=user_info, feedbacks=feedbacks
+            "admin_feedbacks.html",
+            user_info=user_info,
+            feedbacks=feedbacks,
+            next_cursor=next_cursor,
+            is_first_page=not request.args.get("cursor"),
         )
 
     except (jwt.ExpiredSignatureError, jwt.exceptions.DecodeError) as e:
@@ -1367,8 +2221,7 @@ def admin_orders():
         return redirect(url_for("login"))
 
     try:
-        payload = jwt.decode(token_receive, SECRET_KEY, algorithms=["HS256"])
-        user_info = db.users.find_one({"email": payload["id"]}, {"_id": False})
+        user_info = get_current_user()
         if user_info['profile_image'] == None:
             user_info["profile_image"] = 'https://ik.imagekit.io/coffeeshopteam3/profile_placeholdesr.png'
         if not user_info:
@@ -1381,50 +2234,104 @@ def admin_orders():
         return redirect(url_for("login"))
     
 
+# ===================================== SALES ROLLUP =====================================
+# sales_daily menyimpan total revenue dan jumlah order per hari (_id = "YYYY-MM-DD",
+# waktu lokal server, sama seperti timestamp order). Di-update dengan $inc setiap
+# checkout/hapus order, jadi dashboard tidak perlu aggregate ke seluruh koleksi orders.
+def sales_day_key(timestamp):
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def record_daily_sales(timestamp, revenue, orders=1):
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    db.sales_daily.update_one(
+        {"_id": sales_day_key(day)},
+        {"$inc": {"revenue": revenue, "orders": orders}, "$setOnInsert": {"date": day}},
+        upsert=True,
+    )
+
+
+@app.cli.command("rebuild-sales-rollup")
+def rebuild_sales_rollup():
+    """Bangun ulang koleksi sales_daily dari seluruh data orders."""
+    days = db.orders.aggregate([
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            "revenue": {"$sum": "$total_price"},
+            "orders": {"$sum": 1},
+        }},
+    ])
+
+    db.sales_daily.delete_many({})
+    rollup = [
+        {
+            "_id": day["_id"],
+            "date": datetime.strptime(day["_id"], "%Y-%m-%d"),
+            "revenue": day["revenue"],
+            "orders": day["orders"],
+        }
+        for day in days
+    ]
+    if rollup:
+        db.sales_daily.insert_many(rollup)
+    print(f"Rebuilt sales rollup for {len(rollup)} day(s)")
+
+
+@app.route("/api/menu_cache", methods=["GET"])
+@admin_required
+def get_menu_cache_stats():
+    return jsonify(menu_cache_stats())
+
+
+@app.route("/api/cache_stats", methods=["GET"])
+@admin_required
+def get_cache_stats():
+    return jsonify({
+        "menu": menu_cache_stats(),
+        "pages": page_cache_stats(),
+        "fragments": fragment_cache_stats(),
+        "order_views": order_view_cache_stats(),
+    })
+
+
+@app.route("/metrics", methods=["GET"])
+@admin_required
+def metrics():
+    response = make_response(render_metrics())
+    response.mimetype = "text/plain"
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
 @app.route("/api/overview", methods=["GET"])
 @admin_required
 def get_overview():
     today = datetime.today()
     start_of_today = datetime(today.year, today.month, today.day)
-    end_of_today = start_of_today + timedelta(days=1)
-    
     start_of_yesterday = start_of_today - timedelta(days=1)
-    end_of_yesterday = start_of_today
-
     start_of_month = datetime(today.year, today.month, 1)
-    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1)
 
-    total_profit_month_cursor = db.orders.aggregate([
-        {"$match": {"timestamp": {"$gte": start_of_month, "$lt": end_of_month}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}
-    ])
-    
-    total_profit_month = total_profit_month_cursor.next()["total"] if total_profit_month_cursor.alive else 0
-    
-    # total_profit_cursor = db.orders.aggregate([
-    #     {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}
-    # ])
-    
-    # total_profit = total_profit_cursor.next()["total"] if total_profit_cursor.alive else 0
-    
-    profit_today_cursor = db.orders.aggregate([
-        {"$match": {"timestamp": {"$gte": start_of_today, "$lt": end_of_today}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}
-    ])
-    
-    profit_today = profit_today_cursor.next()["total"] if profit_today_cursor.alive else 0
-    
-    profit_yesterday_cursor = db.orders.aggregate([
-        {"$match": {"timestamp": {"$gte": start_of_yesterday, "$lt": end_of_yesterday}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}
-    ])
-    profit_yesterday = profit_yesterday_cursor.next()["total"] if profit_yesterday_cursor.alive else 0
-    
+    # satu query kecil: semua hari dari awal bulan (atau kemarin, kalau hari ini tanggal 1)
+    days = {
+        day["_id"]: day
+        for day in db.sales_daily.find({
+            "_id": {
+                "$gte": sales_day_key(min(start_of_month, start_of_yesterday)),
+                "$lte": sales_day_key(start_of_today),
+            }
+        })
+    }
+
+    total_profit_month = sum(
+        day["revenue"] for key, day in days.items() if key >= sales_day_key(start_of_month)
+    )
+    profit_today = days.get(sales_day_key(start_of_today), {}).get("revenue", 0)
+    profit_yesterday = days.get(sales_day_key(start_of_yesterday), {}).get("revenue", 0)
+
     profit_change = ((profit_today - profit_yesterday) / profit_yesterday * 100) if profit_yesterday != 0 else 0
-    
-    
-    customers = db.users.count_documents({})
-    
+
+    customers = db.users.estimated_document_count()
+
     overview_data = {
         "turnover_month": total_profit_month,
         "profit": profit_today,
@@ -1435,45 +2342,179 @@ def get_overview():
 
 
 
+ORDERS_PAGE_SIZE = 20
+ORDER_SORT_FIELDS = {"date": "timestamp", "value": "total_price", "order_id": "order_id"}
+
+
+def order_filter_query(args):
+    """Query orders dari parameter status (dipisah koma), start dan end (YYYY-MM-DD, inklusif).
+
+    ValueError kalau format tanggal salah.
+    """
+    query = {}
+    statuses = [status for status in args.get("status", "").split(",") if status]
+    if statuses:
+        query["status"] = {"$in": statuses}
+
+    date_range = {}
+    if args.get("start"):
+        date_range["$gte"] = datetime.strptime(args["start"], "%Y-%m-%d")
+    if args.get("end"):
+        # tanggal end ikut dihitung (inklusif)
+        date_range["$lt"] = datetime.strptime(args["end"], "%Y-%m-%d") + timedelta(days=1)
+    if date_range:
+        query["timestamp"] = date_range
+    return query
+
+
 @app.route("/api/orders", methods=["GET"])
 @admin_required
 def get_detailed_report():
-    orders = db.orders.find()
-    
-    orders_dict = {}
+    try:
+        query = order_filter_query(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
 
+    sort_field = ORDER_SORT_FIELDS.get(request.args.get("sort"), "timestamp")
+    descending = request.args.get("order", "desc") != "asc"
+    limit = min(max(request.args.get("limit", ORDERS_PAGE_SIZE, type=int), 1), 100)
+
+    try:
+        orders, next_cursor = find_page(
+            db.orders,
+            query,
+            sort_field,
+            descending=descending,
+            cursor=request.args.get("cursor"),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # nama customer untuk satu halaman diambil dengan satu query
+    emails = list({order["user_email"] for order in orders})
+    names = {
+        user["email"]: user["user_name"]
+        for user in find_profile("users", {"email": {"$in": emails}}, "names")
+    }
+
+    orders_list = []
     for order in orders:
-        name = db.users.find_one({"email": order["user_email"]})["user_name"]
-        total_value = sum(item["price"] * item["quantity"] for item in order["order_items"])
         menu_items = []
-
         for item in order["order_items"]:
             if isinstance(item["option2"], list):
                 item["option2"] = ", ".join(item["option2"])
-            menu_items.append(f"{item['name']} | {item['option1']} , {item['option2']} x{item['quantity']}") 
-        
-        order_id = order["order_id"]
-        if order_id not in orders_dict:
-            orders_dict[order_id] = {
-                "order_id": order_id,
-                "name": name,
-                "menu": "<br>".join(menu_items),
-                "value": total_value,
-                "date": order["timestamp"],
-                "status": order["status"]
+            menu_items.append(f"{item['name']} | {item['option1']} , {item['option2']} x{item['quantity']}")
+
+        orders_list.append({
+            "order_id": order["order_id"],
+            "name": names.get(order["user_email"], "Unknown User"),
+            "menu": "<br>".join(menu_items),
+            "value": sum(item["price"] * item["quantity"] for item in order["order_items"]),
+            "date": order["timestamp"].strftime("%d/%m/%Y"),
+            "status": order["status"],
+        })
+
+    return jsonify({"orders": orders_list, "next_cursor": next_cursor})
+
+
+# ===================================== ORDER EXPORT =====================================
+# Export untuk accounting: satu baris per item order, di-stream per batch dari cursor Mongo
+# supaya memori tetap kecil berapa pun jumlah order dan byte pertama langsung terkirim.
+EXPORT_BATCH_SIZE = 500
+EXPORT_COLUMNS = [
+    "order_id", "timestamp", "status", "customer_email", "customer_name",
+    "menu_id", "item_name", "option1", "option2", "quantity", "price", "line_total", "order_total",
+]
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_order_rows(orders):
+    emails = list({order["user_email"] for order in orders})
+    names = {
+        user["email"]: user["user_name"]
+        for user in find_profile("users", {"email": {"$in": emails}}, "names")
+    }
+    for order in orders:
+        for item in order.get("order_items", []):
+            option2 = item.get("option2")
+            if isinstance(option2, list):
+                option2 = ", ".join(option2)
+            yield {
+                "order_id": order["order_id"],
+                "timestamp": order["timestamp"].isoformat(),
+                "status": order["status"],
+                "customer_email": order["user_email"],
+                "customer_name": names.get(order["user_email"], "Unknown User"),
+                "menu_id": item.get("menuId"),
+                "item_name": item.get("name"),
+                "option1": item.get("option1"),
+                "option2": option2,
+                "quantity": item["quantity"],
+                "price": item["price"],
+                "line_total": item["price"] * item["quantity"],
+                "order_total": order["total_price"],
             }
-        else:
-            orders_dict[order_id]["menu"] += "<br>" + "<br>".join(menu_items)
-            orders_dict[order_id]["value"] += total_value
 
-    orders_list = list(orders_dict.values())
-    
-    status_order = {"NEW": 1, "IN-PROGRESS": 2, "COMPLETED": 3}
-    orders_list.sort(key=lambda x: (status_order.get(x["status"], 4), -x["date"].timestamp()))
-    for order in orders_list:
-        order["date"] = order["date"].strftime("%d/%m/%Y")
-    
-    return jsonify(orders_list)
+
+def export_order_batches(query):
+    cursor = (
+        db.orders.find(
+            query,
+            {"_id": False, "order_id": True, "timestamp": True, "status": True,
+             "user_email": True, "order_items": True, "total_price": True},
+        )
+        .sort([("timestamp", 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    batch = []
+    for order in cursor:
+        batch.append(order)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_order_export(query, export_format):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for orders in export_order_batches(query):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_order_rows(orders))
+            yield buffer.getvalue()
+    else:
+        for orders in export_order_batches(query):
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in export_order_rows(orders))
+
+
+@app.route("/api/orders/export", methods=["GET"])
+@admin_required
+def export_orders():
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Unsupported format, use csv or ndjson"}), 400
+    try:
+        query = order_filter_query(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+
+    file_name = "orders-{}-{}.{}".format(
+        request.args.get("start", "all"), request.args.get("end", "now"), export_format
+    )
+    return Response(
+        stream_with_context(generate_order_export(query, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": "attachment; filename={}".format(file_name)},
+    )
 
 
 
@@ -1488,6 +2529,7 @@ def update_order_status():
             return jsonify({"success": False, "message": "Missing order ID or status"})
 
         db.orders.update_one({"order_id": order_id}, {"$set": {"status": new_status}})
+        invalidate_order_views(order_id)
 
         return jsonify({"success": True, "message": "Order status updated successfully"})
 
@@ -1506,6 +2548,7 @@ def update_role():
             return jsonify({"success": False, "message": "Missing Email or role"})
 
         db.users.update_one({"email": email}, {"$set": {"role": role}})
+        invalidate_user_cache(email)
 
         return jsonify({"success": True, "message": "Role updated successfully"})
 
@@ -1517,7 +2560,7 @@ def update_role():
 @app.route("/api/users")
 @admin_required
 def api_users():
-    users = list(db.users.find({}))
+    users = list(find_profile("users", {}, "admin-list"))
     user_data = []
     for user in users:
         user_data.append(
@@ -1557,6 +2600,7 @@ def upload():
             "sold": 0,
         }
         db.menu.insert_one(menu)
+        invalidate_menu_cache()
         return jsonify({"result": "success"})
 
 
@@ -1573,45 +2617,29 @@ def uploads():
     
     image_name = nama
     image_file = request.files['image_file']
-    filename = secure_filename(image_file.filename)
-    
-    filename1 = secure_filename(image_name)
-    
-    
-    finalFilename = "{}.{}".format(filename1, filename.split(".")[-1])
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    image_file.save(filepath)
-    try:
-        imagekit = ImageKit(
-            private_key=PRIVATE_KEY_TOKEN_IMAGEKIT,
-            public_key=PUBLIC_KEY_TOKEN_IMAGEKIT,
-            url_endpoint='https://ik.imagekit.io/rn4jfgmjp'
-        )
-
-        response = imagekit.upload_file(
-            file=open(filepath, 'rb'),
-            file_name=finalFilename,
-        )
-        
-        image_url = response.response_metadata.raw['url']
-
-        product_data = {
-            "menuId": menu_id,
-            "nama": nama,
-            "harga": harga,
-            "deskripsi": deskripsi,
-            "kategori": kategori,
-            "image": image_url,
-            "sold"  :0
-        }
+    product_data = {
+        "menuId": menu_id,
+        "nama": nama,
+        "harga": harga,
+        "deskripsi": deskripsi,
+        "kategori": kategori,
+        "image": image_url,
+        "sold"  :0
+    }
 
-        db.menu.insert_one(product_data)
-        os.remove(filepath)
-        return redirect(url_for("admin_add_product"))
-    except Exception as e:
-        os.remove(filepath)
-        return jsonify({"message": "Error occurred while uploading image. " + str(e)}),
+    db.menu.insert_one(product_data)
+    invalidate_menu_cache()
+    # gambar di-upload di background, field image di-set setelah upload selesai
+    submit_upload(
+        image_file,
+        upload_file_name(image_file, image_name),
+        db.menu,
+        {"menuId": menu_id},
+        "image",
+        on_done=lambda url: invalidate_menu_cache(),
+    )
+    return redirect(url_for("admin_add_product"))
 
 # route for admin to upload new user's data
 @app.route('/upload_user', methods=['POST'])
@@ -1625,32 +2653,9 @@ def upload_user():
     role = request.form.get("role")
     password = request.form.get("password")
 
-    # put image to imagekit
     image_file = request.files.get('image_file')
-    if image_file:
-        filename = secure_filename(image_file.filename)
-        filename1 = secure_filename(user_name)
-        finalFilename = "{}.{}".format(filename1, filename.split('.')[-1])
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], finalFilename)
-        image_file.save(filepath)
-
-        try:
-            imagekit = ImageKit(
-                private_key=PRIVATE_KEY_TOKEN_IMAGEKIT,
-                public_key=PUBLIC_KEY_TOKEN_IMAGEKIT,
-                url_endpoint='https://ik.imagekit.io/coffeeshopteam3'
-            )
-            response = imagekit.upload_file(
-                file=open(filepath, 'rb'),
-                file_name=finalFilename,
-            )
-            image_url = response.url 
-            os.remove(filepath)
-        except Exception as e:
-            os.remove(filepath)
-            return jsonify({"message": "Error occurred while uploading image. " + str(e)}), 500
-    else:
-        image_url = profile_image if profile_image else 'https://ik.imagekit.io/coffeeshopteam3/blank-profile-picture-973460_960_720.png'
+    # sampai upload background selesai, user memakai gambar default
+    image_url = profile_image if profile_image else 'https://ik.imagekit.io/coffeeshopteam3/blank-profile-picture-973460_960_720.png'
 
     password = hashlib.sha256(password.encode('utf-8')).hexdigest()
 
@@ -1665,6 +2670,9 @@ def upload_user():
     }
 
     db.users.insert_one(user_data)
+    # put image to imagekit
+    if image_file:
+        upload_profile_image(image_file, user_name, email)
     return redirect(url_for("admin_user_list"))
 
 
@@ -1673,6 +2681,7 @@ def upload_user():
 def remove_product():
     product_id = request.form.get("productId")
     db.menu.delete_one({"menuId": product_id})
+    invalidate_menu_cache()
     return redirect(url_for("admin_update_menu"))
 
 @app.route('/edit_product', methods=['POST'])
@@ -1685,29 +2694,6 @@ def edit_product():
     image_url = request.form.get("currentImage")
 
     image_file = request.files.get('image_file')
-    if image_file:
-        filename = secure_filename(image_file.filename)
-        filename1 = secure_filename(nama)
-        finalFilename = filename1 + "." + filename.split('.')[-1]
-
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(filepath)
-        
-        try:
-            imagekit = ImageKit(
-                private_key=PRIVATE_KEY_TOKEN_IMAGEKIT,
-                public_key=PUBLIC_KEY_TOKEN_IMAGEKIT,
-                url_endpoint='https://ik.imagekit.io/coffeeshopteam3'
-            )
-            response = imagekit.upload_file(
-                file=open(filepath, 'rb'),
-                file_name=finalFilename,
-            )
-            image_url = response.response_metadata.raw['url']
-            os.remove(filepath)
-        except Exception as e:
-            os.remove(filepath)
-            return jsonify({"message": "Error occurred while uploading image. " + str(e)})
 
     db.menu.update_one(
         {"menuId": product_id},
@@ -1718,6 +2704,16 @@ def edit_product():
             "image": image_url
         }}
     )
+    invalidate_menu_cache()
+    if image_file:
+        submit_upload(
+            image_file,
+            upload_file_name(image_file, nama),
+            db.menu,
+            {"menuId": product_id},
+            "image",
+            on_done=lambda url: invalidate_menu_cache(),
+        )
 
     return redirect(url_for("admin_update_menu"))
 
@@ -1727,6 +2723,7 @@ def edit_product():
 def delete_user():
     email = request.form.get("email")
     db.users.delete_one({"email": email})
+    invalidate_user_cache(email)
     return redirect(url_for("admin_user_list"))
 
 
@@ -1752,16 +2749,208 @@ def delete_order():
         print(f"Order ID {order_id} not found in database")
         return jsonify({"error": "Order not found"}), 404
     
-    result = db.orders.delete_one({"order_id": order_id})
+    result = db.orders.delete_one({"_id": order["_id"]})
     
     if result.deleted_count == 0:
         print(f"Failed to delete order ID {order_id}")
         return jsonify({"error": "Failed to delete order"}), 500
+
+    record_daily_sales(order["timestamp"], -order["total_price"], orders=-1)
+    invalidate_order_views(order_id)
     
     print(f"Successfully deleted order ID {order_id}")
     return redirect(url_for("admin_orders"))
 
  
   
+# ===================================== INDEXES =====================================
+# Semua index yang dibutuhkan query di app ini. create_index idempotent, jadi aman
+# dijalankan setiap startup atau lewat "flask ensure-indexes".
+INDEXES = [
+    ("users", [("email", 1)], {"unique": True}),
+    ("users", [("user_name", 1)], {}),
+    ("menu", [("menuId", 1)], {}),
+    ("orders", [("order_id", 1)], {}),
+    ("orders", [("user_email", 1), ("timestamp", -1), ("_id", -1)], {}),
+    ("orders", [("timestamp", -1), ("_id", -1)], {}),
+    ("orders", [("status", 1), ("timestamp", -1), ("_id", -1)], {}),
+    ("orders", [("total_price", -1), ("_id", -1)], {}),
+    ("orders", [("order_id", -1), ("_id", -1)], {}),
+    ("reviews", [("item_id", 1), ("user_email", 1), ("order_id", 1)], {}),
+    ("reviews", [("item_id", 1), ("timestamp", -1), ("_id", -1)], {}),
+    ("vouchers", [("code", 1)], {}),
+    ("feedbacks", [("timestamp", -1), ("_id", -1)], {}),
+    ("carts", [("email", 1)], {"unique": True}),
+]
+
+# index lama yang sudah digantikan index di atas, dihapus oleh ensure_indexes()
+SUPERSEDED_INDEXES = [
+    # digantikan (user_email, timestamp, _id) untuk keyset pagination order history
+    ("orders", [("user_email", 1), ("timestamp", -1)]),
+    # listing menu dilayani katalog di memori (MENU CACHE), tidak ada query yang memakai ini
+    ("menu", [("kategori", 1), ("average_rating", -1)]),
+    ("menu", [("average_rating", -1)]),
+]
+
+# query representatif tiap route: (route, koleksi, filter, sort)
+INDEX_AUDIT_QUERIES = [
+    ("auth / sign_in", "users", {"email": "audit@example.com"}, None),
+    ("/product/<menuId>", "menu", {"menuId": "C01"}, None),
+    ("/profile/, /order_history", "orders", {"user_email": "audit@example.com"}, [("timestamp", -1), ("_id", -1)]),
+    ("/view_receipt/<order_id>", "orders", {"order_id": 1}, None),
+    ("/api/orders", "orders", {}, [("timestamp", -1), ("_id", -1)]),
+    ("/api/orders?status", "orders", {"status": {"$in": ["NEW"]}}, [("timestamp", -1), ("_id", -1)]),
+    ("/api/orders?sort=value", "orders", {}, [("total_price", -1), ("_id", -1)]),
+    ("/api/orders?sort=order_id", "orders", {}, [("order_id", -1), ("_id", -1)]),
+    ("/check_review, /submit_review", "reviews", {"item_id": "C01", "user_email": "audit@example.com", "order_id": 1}, None),
+    ("/api/reviews/<menuId>", "reviews", {"item_id": "C01"}, [("timestamp", -1), ("_id", -1)]),
+    ("/apply_voucher", "vouchers", {"code": "AUDIT"}, None),
+    ("/admin_edit_user/<user_name>", "users", {"user_name": "audit"}, None),
+    ("/admin_feedbacks/", "feedbacks", {}, [("timestamp", -1), ("_id", -1)]),
+]
+
+
+def ensure_indexes():
+    for collection, keys, options in INDEXES:
+        try:
+            name = db[collection].create_index(keys, **options)
+            print(f"Index {collection}.{name} OK")
+        except OperationFailure as e:
+            print(f"Failed to create index on {collection} {keys}: {e}")
+
+    for collection, keys in SUPERSEDED_INDEXES:
+        for name, info in db[collection].index_information().items():
+            if [tuple(key) for key in info["key"]] == keys:
+                try:
+                    db[collection].drop_index(name)
+                    print(f"Dropped superseded index {collection}.{name}")
+                except OperationFailure as e:
+                    print(f"Failed to drop index {collection}.{name}: {e}")
+
+
+def find_plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child in plan.get("inputStages", []) + [plan.get("inputStage")]:
+        if child:
+            stages += find_plan_stages(child)
+    return stages
+
+
+@app.cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Buat semua index di INDEXES (idempotent)."""
+    ensure_indexes()
+
+
+@app.cli.command("audit-indexes")
+def audit_indexes():
+    """Jalankan explain() untuk query tiap route dan tandai yang masih COLLSCAN."""
+    collscans = 0
+    for route, collection, query, sort in INDEX_AUDIT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.limit(20).explain()["queryPlanner"]["winningPlan"]
+        stages = find_plan_stages(plan)
+        if "COLLSCAN" in stages:
+            collscans += 1
+            print(f"COLLSCAN  {route} ({collection})")
+        else:
+            print(f"ok        {route} ({collection}): {' <- '.join(s for s in stages if s)}")
+
+    if collscans:
+        raise SystemExit(f"{collscans} route query(s) still do a COLLSCAN")
+
+
+# (role, path, profile yang boleh dipakai route itu per koleksi)
+# {menu_id} dan {order_id} diisi dari data yang ada di database
+PROJECTION_AUDIT_ROUTES = [
+    ("anon", "/", {"menu": {"catalog"}}),
+    ("anon", "/menu/", {"menu": {"catalog"}}),
+    ("anon", "/filter_menu", {"menu": {"catalog"}}),
+    ("anon", "/product/{menu_id}", {"menu": {"catalog"}, "users": {"reviewer"}}),
+    ("anon", "/api/reviews/{menu_id}", {"menu": {"catalog"}, "users": {"reviewer"}}),
+    ("user", "/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("user", "/about/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("user", "/contact/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("user", "/menu/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("user", "/cart/", {"menu": {"catalog", "cart-line"}, "users": {"navbar", "cart"}}),
+    ("user", "/profile/", {"users": {"navbar", "profile"}}),
+    ("user", "/order_history", {"users": {"navbar"}}),
+    ("user", "/product/{menu_id}", {"menu": {"catalog"}, "users": {"navbar", "reviewer"}}),
+    ("admin", "/dashboard/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("admin", "/admin_user_list/", {"users": {"navbar", "admin-list"}}),
+    ("admin", "/admin_update_menu/", {"menu": {"catalog"}, "users": {"navbar"}}),
+    ("admin", "/admin_orders/", {"menu": {"catalog"}, "users": {"navbar", "names"}}),
+    ("admin", "/admin_feedbacks/", {"users": {"navbar"}}),
+    ("admin", "/api/users", {"users": {"navbar", "admin-list"}}),
+    ("admin", "/api/orders", {"users": {"navbar", "names"}}),
+    ("admin", "/view_bill/{order_id}", {"users": {"navbar"}}),
+]
+
+
+def projection_violation(collection, command_projection, allowed_profiles):
+    fields = {field for field, included in command_projection.items() if included and field != "_id"}
+    if not fields:
+        return "no projection (full document)"
+    # field harus sama persis dengan profile yang memang boleh dipakai route ini,
+    # jadi lookup navbar yang memakai profile "account" (ada password) tetap tertangkap
+    for profile in allowed_profiles.get(collection, ()):
+        if fields == set(PROJECTIONS[collection][profile]):
+            return None
+    return "fields {} do not match allowed profiles {}".format(
+        sorted(fields), sorted(allowed_profiles.get(collection, ()))
+    )
+
+
+@app.cli.command("audit-projections")
+@click.option("--user-email", required=True, help="email user biasa yang ada di database")
+@click.option("--admin-email", required=True, help="email admin yang ada di database")
+def audit_projections(user_email, admin_email):
+    """Jalankan route lewat test client dan tandai query users/menu yang mengambil field di luar PROJECTIONS."""
+    menu = find_one_profile("menu", {}, "ids") or {}
+    order = db.orders.find_one({}, {"_id": False, "order_id": True}) or {}
+    clients = {"anon": app.test_client(), "user": app.test_client(), "admin": app.test_client()}
+    for role, email in (("user", user_email), ("admin", admin_email)):
+        payload = {"id": email, "exp": datetime.now(timezone.utc) + timedelta(minutes=10)}
+        clients[role].set_cookie("mytoken", jwt.encode(payload, SECRET_KEY, algorithm="HS256"))
+
+    violations = 0
+    for role, path, allowed_profiles in PROJECTION_AUDIT_ROUTES:
+        # cache dikosongkan supaya setiap route benar-benar query ke Mongo
+        invalidate_menu_cache()
+        drop_user_cache()
+
+        url = path.format(menu_id=menu.get("menuId", ""), order_id=order.get("order_id", 0))
+        start_capture()
+        try:
+            clients[role].get(url).close()
+        finally:
+            commands = stop_capture()
+
+        problems = [
+            "{}.{}: {}".format(collection, command_name, problem)
+            for command_name, collection, command_projection in commands
+            if command_name == "find" and collection in PROJECTIONS
+            for problem in [projection_violation(collection, command_projection, allowed_profiles)]
+            if problem
+        ]
+        if not commands:
+            # mis. mongomock tidak mengirim event command, jadi tidak ada yang bisa diperiksa
+            violations += 1
+            print(f"NO QUERY  {role:<5} {url}: no Mongo commands captured, nothing was audited")
+            continue
+        violations += len(problems)
+        if problems:
+            for problem in problems:
+                print(f"OVERFETCH {role:<5} {url}: {problem}")
+        else:
+            print(f"ok        {role:<5} {url} ({len(commands)} commands)")
+
+    if violations:
+        raise SystemExit(f"{violations} problem(s): queries outside the allowed profiles or routes not audited")
+
+
 if __name__ == "__main__":
+    ensure_indexes()
     app.run("0.0.0.0", port=6358, debug=True)
@@ -0,0 +1,104 @@
+from functools import lru_cache
+import threading
+import timeit
+
+from babel import Locale
+from babel.numbers import (
+    format_currency,
+    get_currency_precision,
+    get_currency_symbol,
+    get_decimal_symbol,
+    get_group_symbol,
+)
+
+
+# Format harga IDR dipakai di hampir semua halaman (grid menu, similar items, cart, admin).
+# Pola id_ID dari Babel di-compile sekali jadi prefix/suffix + simbol, lalu bilangan bulat
+# diformat langsung dengan str.format. Nilai lain (desimal, None, ...) tetap lewat Babel.
+CURRENCY = "IDR"
+CURRENCY_LOCALE = "id_ID"
+CURRENCY_MEMO_SIZE = 4096
+
+compiled_pattern = None
+compile_lock = threading.Lock()
+
+
+def babel_currency(amount, currency=CURRENCY, locale=CURRENCY_LOCALE):
+    # cara lama, dipakai sebagai fallback dan pembanding di benchmark
+    formatted_value = format_currency(amount, currency, locale=locale)
+    return formatted_value.replace("Rp", "Rp ")
+
+
+def compile_pattern():
+    global compiled_pattern
+    with compile_lock:
+        if compiled_pattern is None:
+            locale = Locale.parse(CURRENCY_LOCALE)
+            pattern = locale.currency_formats["standard"]
+            symbol = get_currency_symbol(CURRENCY, locale=locale).replace("Rp", "Rp ")
+            precision = get_currency_precision(CURRENCY)
+            decimals = get_decimal_symbol(locale) + "0" * precision if precision else ""
+            compiled_pattern = {
+                "prefix": [p.replace("¤", symbol) for p in pattern.prefix],
+                "suffix": [s.replace("¤", symbol) for s in pattern.suffix],
+                "group": get_group_symbol(locale),
+                "decimals": decimals,
+                "grouped": pattern.grouping == (3, 3),
+            }
+        return compiled_pattern
+
+
+@lru_cache(maxsize=CURRENCY_MEMO_SIZE)
+def format_integer(amount):
+    pattern = compile_pattern()
+    sign = 1 if amount < 0 else 0
+    digits = "{:,}".format(abs(amount)).replace(",", pattern["group"])
+    return pattern["prefix"][sign] + digits + pattern["decimals"] + pattern["suffix"][sign]
+
+
+def formatted_currency(amount, currency=CURRENCY, locale=CURRENCY_LOCALE):
+    """Format amount sebagai rupiah, contoh 15000 -> "Rp 15.000,00"."""
+    if currency != CURRENCY or locale != CURRENCY_LOCALE or not compile_pattern()["grouped"]:
+        return babel_currency(amount, currency, locale)
+    if isinstance(amount, float) and amount.is_integer():
+        amount = int(amount)
+    if type(amount) is int:
+        return format_integer(amount)
+    return babel_currency(amount, currency, locale)
+
+
+def formatted_currency_many(amounts):
+    """Format satu list harga sekaligus, hasilnya list dengan urutan yang sama."""
+    return [formatted_currency(amount) for amount in amounts]
+
+
+def format_field(items, field, target=None):
+    """Ganti (atau isi target) field harga di setiap dict dengan versi terformat."""
+    values = formatted_currency_many(int(item[field]) for item in items)
+    for item, value in zip(items, values):
+        item[target or field] = value
+    return items
+
+
+def memo_stats():
+    info = format_integer.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def benchmark(number=20000):
+    # harga realistis: kelipatan 500 dengan beberapa nilai berulang seperti di grid menu
+    amounts = [(i * 500) % 250000 for i in range(200)]
+    for amount in amounts:
+        assert formatted_currency(amount) == babel_currency(amount), amount
+
+    rounds = max(number // len(amounts), 1)
+    babel_time = timeit.timeit(lambda: [babel_currency(a) for a in amounts], number=rounds)
+    fast_time = timeit.timeit(lambda: formatted_currency_many(amounts), number=rounds)
+    calls = rounds * len(amounts)
+    print("babel format_currency: {:.2f} us/call".format(babel_time / calls * 1e6))
+    print("formatted_currency:    {:.2f} us/call".format(fast_time / calls * 1e6))
+    print("speedup:               {:.1f}x".format(babel_time / fast_time))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import threading
+import time
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+# Cache untuk potongan template yang sama untuk semua user (grid menu, similar items, footer).
+# Pemakaian di template:
+#     {% cache "similar_menu", menu_item.menuId %} ... {% endcache %}
+# Key = nama fragment + argumen + versi data dari environment.fragment_cache_version(),
+# jadi begitu data berubah fragment lama tidak terpakai lagi dan hilang lewat LRU.
+# Versi None berarti data tidak konsisten: fragment di-render tanpa disimpan.
+FRAGMENT_CACHE_MAX_ENTRIES = 512
+
+fragment_lock = threading.Lock()
+fragments = OrderedDict()
+fragment_stats = {}
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache_version=lambda: 0)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_fragment", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, key_parts, caller):
+        name = key_parts[0]
+        version = self.environment.fragment_cache_version()
+        if version is None:
+            return caller()
+        key = (tuple(key_parts), version)
+        with fragment_lock:
+            stats = fragment_stats.setdefault(name, {"hits": 0, "misses": 0, "render_ms": 0.0})
+            html = fragments.get(key)
+            if html is not None:
+                fragments.move_to_end(key)
+                stats["hits"] += 1
+                return html
+
+        started = time.perf_counter()
+        html = caller()
+        elapsed = (time.perf_counter() - started) * 1000
+
+        with fragment_lock:
+            stats["misses"] += 1
+            stats["render_ms"] += elapsed
+            fragments[key] = html
+            while len(fragments) > FRAGMENT_CACHE_MAX_ENTRIES:
+                fragments.popitem(last=False)
+        return html
+
+
+def clear_fragment_cache():
+    with fragment_lock:
+        fragments.clear()
+
+
+def fragment_cache_stats():
+    with fragment_lock:
+        return {
+            "entries": len(fragments),
+            "fragments": {
+                name: {
+                    "hits": stats["hits"],
+                    "misses": stats["misses"],
+                    "avg_render_ms": round(stats["render_ms"] / stats["misses"], 3) if stats["misses"] else 0,
+                }
+                for name, stats in fragment_stats.items()
+            },
+        }
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+
+
+# Pre-fork: app di-load sekali di master (preload_app), worker di-fork dari situ dan
+# masing-masing membuat MongoClient sendiri saat pertama query (lihat get_mongo_client).
+#
+# Reload tanpa downtime (pid master ada di .data/gunicorn.pid):
+#   kill -HUP  <pid>   restart worker dengan konfigurasi baru (kode tetap dari master)
+#   kill -USR2 <pid>   jalankan master baru dengan kode baru, lalu
+#   kill -QUIT <pid lama> setelah worker baru siap
+bind = "{}:{}".format(os.environ.get("HOST", "0.0.0.0"), os.environ.get("PORT", 6358))
+# cache di memori tiap worker saling sinkron lewat versi bersama (SHARED CACHE VERSION di app.py)
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# worker di-restart berkala supaya memori cache per worker tidak tumbuh tanpa batas
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+os.makedirs(".data", exist_ok=True)
+pidfile = ".data/gunicorn.pid"
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # buang client apa pun yang sempat dibuat di master sebelum fork
+    from app import mongo_client
+
+    mongo_client["client"] = None
+    mongo_client["pid"] = None
+
+
+def worker_exit(server, worker):
+    from app import close_mongo_client
+
+    close_mongo_client()
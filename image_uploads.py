@@ -0,0 +1,137 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from imagekitio import ImageKit
+from werkzeug.utils import secure_filename
+
+
+# Upload gambar dijalankan di thread pool terbatas, jadi request tidak menunggu transfer ke
+# ImageKit. Setelah selesai, URL hasil upload ditulis ke dokumen Mongo yang bersangkutan.
+# IMAGE_UPLOAD_BACKEND: "imagekit" (default) atau "local" (simpan ke static/uploads, untuk testing).
+# Env dibaca saat dipakai karena app.py memanggil load_dotenv setelah modul ini di-import.
+IMAGE_UPLOAD_MAX_PENDING = 32
+
+# Turunan gambar (WebP, sisi terpanjang maksimal N px) yang dibuat saat upload dan disimpan
+# di field "<field>_variants". thumb: avatar/navbar, card: grid menu, large: halaman produk.
+IMAGE_VARIANTS = {
+    "thumb": 96,
+    "card": 480,
+    "large": 960,
+}
+
+imagekit_client = None
+upload_pool = None
+upload_lock = threading.Lock()
+upload_slots = threading.BoundedSemaphore(IMAGE_UPLOAD_MAX_PENDING)
+
+
+def get_imagekit_client():
+    global imagekit_client
+    with upload_lock:
+        if imagekit_client is None:
+            imagekit_client = ImageKit(
+                private_key=os.environ.get("PRIVATE_KEY_TOKEN_IMAGEKIT"),
+                public_key=os.environ.get("PUBLIC_KEY_TOKEN_IMAGEKIT"),
+                url_endpoint=os.environ.get("IMAGEKIT_URL_ENDPOINT", "https://ik.imagekit.io/coffeeshopteam3"),
+            )
+        return imagekit_client
+
+
+def get_upload_pool():
+    global upload_pool
+    with upload_lock:
+        if upload_pool is None:
+            max_workers = int(os.environ.get("IMAGE_UPLOAD_WORKERS", 4))
+            upload_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-upload")
+        return upload_pool
+
+
+def upload_imagekit(data, file_name):
+    response = get_imagekit_client().upload_file(file=data, file_name=file_name)
+    return response.url
+
+
+def upload_local(data, file_name):
+    upload_folder = os.environ.get("UPLOAD_FOLDER", "./static/uploads")
+    os.makedirs(upload_folder, exist_ok=True)
+    file_name = secure_filename(file_name)
+    with open(os.path.join(upload_folder, file_name), "wb") as f:
+        f.write(data)
+    return "/static/uploads/" + file_name
+
+
+UPLOAD_BACKENDS = {
+    "imagekit": upload_imagekit,
+    "local": upload_local,
+}
+
+
+def upload_file_name(image_file, name):
+    extension = secure_filename(image_file.filename).split(".")[-1]
+    return "{}.{}".format(secure_filename(name), extension)
+
+
+def make_variants(data):
+    # Pillow opsional: tanpa Pillow hanya gambar asli yang di-upload
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Pillow is not installed, skipping image variants")
+        return {}
+
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for name, size in IMAGE_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            output = io.BytesIO()
+            variant.save(output, format="WEBP", quality=80, method=4)
+            variants[name] = output.getvalue()
+    return variants
+
+
+def run_upload(data, file_name, collection, query, field, on_done):
+    try:
+        backend = UPLOAD_BACKENDS[os.environ.get("IMAGE_UPLOAD_BACKEND", "imagekit")]
+        url = backend(data, file_name)
+
+        base_name = file_name.rsplit(".", 1)[0]
+        variant_urls = {}
+        for name, variant_data in make_variants(data).items():
+            variant_urls[name] = backend(variant_data, "{}-{}.webp".format(base_name, name))
+
+        # variants selalu di-set ulang supaya tidak tertinggal turunan dari gambar lama
+        collection.update_one(query, {"$set": {field: url, field + "_variants": variant_urls}})
+        if on_done:
+            on_done(url)
+        return url
+    except Exception as e:
+        print(f"Error occurred while uploading image {file_name}: {e}")
+    finally:
+        upload_slots.release()
+
+
+def submit_upload(image_file, file_name, collection, query, field, on_done=None):
+    """Upload image_file di background lalu set field pada dokumen yang cocok dengan query.
+
+    Isi file dibaca langsung dari request (tanpa file sementara) sebelum request selesai.
+    Kalau antrian penuh, pemanggil menunggu sampai ada slot kosong.
+    """
+    data = image_file.read()
+    upload_slots.acquire()
+    try:
+        return get_upload_pool().submit(run_upload, data, file_name, collection, query, field, on_done)
+    except Exception:
+        upload_slots.release()
+        raise
+
+
+def image_variant(doc, field, size):
+    """Jinja filter: URL turunan terkecil yang cocok, atau gambar asli kalau belum ada."""
+    if not doc:
+        return None
+    variants = doc.get(field + "_variants") or {}
+    return variants.get(size) or doc.get(field)
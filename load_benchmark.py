@@ -0,0 +1,410 @@
+"""Load benchmark untuk route app.py.
+
+Mengisi database benchmark (default mongodb://localhost:27017/buono_bench, dihapus dan
+di-seed ulang setiap run) lalu menjalankan route storefront, cart, checkout dan admin
+lewat Flask test client. Hasil p50/p95/p99 dan throughput per route disimpan sebagai JSON
+supaya bisa dibandingkan antar commit:
+
+    python load_benchmark.py --requests 300 --output .data/benchmarks/before.json
+    python load_benchmark.py --requests 300 --compare .data/benchmarks/before.json
+
+Jangan arahkan --mongodb-uri/--db ke database production, semua koleksi di-drop.
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+
+BENCH_COLLECTIONS = [
+    "users", "menu", "orders", "reviews", "feedbacks", "vouchers",
+    "counters", "sales_daily", "carts",
+]
+CATEGORIES = ["Manual Brewing", "Espresso & Latte", "Tea", "Snacks", "Meals"]
+STATUSES = ["NEW", "IN-PROGRESS", "COMPLETED"]
+BENCH_PASSWORD = "benchmark"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-uri", default=os.environ.get("BENCH_MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "buono_bench"))
+    parser.add_argument("--mongomock", action="store_true",
+                        help="pakai mongomock (in-memory) sebagai pengganti mongod lokal")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--menu", type=int, default=60)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=3000)
+    parser.add_argument("--feedbacks", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200, help="jumlah request per route")
+    parser.add_argument("--warmup", type=int, default=10, help="request pemanasan per route (tidak diukur)")
+    parser.add_argument("--routes", default="", help="hanya jalankan route yang namanya mengandung teks ini")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="file JSON hasil run sebelumnya")
+    return parser.parse_args()
+
+
+def load_app(args):
+    # env harus di-set sebelum app di-import karena MONGODB_URI dan DB_NAME dibaca saat import
+    # (MongoClient sendiri baru dibuat saat query pertama)
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("IMAGE_UPLOAD_BACKEND", "local")
+    import app as app_module
+
+    if args.mongomock:
+        import mongomock
+
+        app_module.db = mongomock.MongoClient()[args.db]
+    app_module.app.config["TESTING"] = True
+    return app_module
+
+
+def make_token(app_module, email):
+    import jwt
+
+    payload = {"id": email, "exp": datetime.now(timezone.utc) + timedelta(days=1)}
+    return jwt.encode(payload, app_module.SECRET_KEY, algorithm="HS256")
+
+
+def seed(app_module, args, rng):
+    db = app_module.db
+    for name in BENCH_COLLECTIONS:
+        db[name].drop()
+
+    password = hashlib.sha256(BENCH_PASSWORD.encode("utf-8")).hexdigest()
+    menus = []
+    for i in range(args.menu):
+        kategori = rng.sample(CATEGORIES, rng.randint(1, 2))
+        menus.append({
+            "menuId": "M{:04d}".format(i + 1),
+            "nama": "Menu {}".format(i + 1),
+            "harga": str(rng.randrange(15000, 95000, 500)),
+            "deskripsi": "Benchmark item {}".format(i + 1),
+            "kategori": kategori,
+            "image": "/static/uploads/bench.png",
+            "sold": 0,
+            **{"rating_{}".format(star): 0 for star in range(1, 6)},
+        })
+
+    users = [{
+        "user_name": "admin",
+        "email": "admin@bench.local",
+        "password": password,
+        "role": "ADMIN",
+        "profile_image": None,
+    }]
+    for i in range(args.users):
+        cart = [{
+            "item_id": "cart-{}-{}".format(i, line),
+            "menuId": rng.choice(menus)["menuId"],
+            "quantity": rng.randint(1, 3),
+            "option1": "Hot",
+            "option2": ["Regular Sugar"],
+        } for line in range(rng.randint(0, 4))]
+        users.append({
+            "user_name": "user{}".format(i),
+            "email": "user{}@bench.local".format(i),
+            "password": password,
+            "role": "USER",
+            "profile_image": None,
+            "phone_number": "08{:010d}".format(i),
+            "address": "Jl. Benchmark {}".format(i),
+            "cart": cart,
+        })
+
+    now = datetime.now()
+    orders = []
+    for i in range(args.orders):
+        items = []
+        for menu in rng.sample(menus, rng.randint(1, min(4, len(menus)))):
+            quantity = rng.randint(1, 3)
+            menu["sold"] += quantity
+            items.append({
+                "item_id": "order-{}-{}".format(i, menu["menuId"]),
+                "menuId": menu["menuId"],
+                "quantity": quantity,
+                "option1": "Hot",
+                "option2": ["Regular Sugar"],
+                "image": menu["image"],
+                "name": menu["nama"],
+                "price": int(menu["harga"]),
+            })
+        orders.append({
+            "order_id": i + 1,
+            "user_email": rng.choice(users[1:])["email"] if args.users else users[0]["email"],
+            "order_items": items,
+            "total_price": sum(item["price"] * item["quantity"] for item in items),
+            "status": rng.choice(STATUSES),
+            "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        })
+
+    reviews = []
+    for i in range(args.reviews if orders else 0):
+        order = rng.choice(orders)
+        item = rng.choice(order["order_items"])
+        rating = rng.randint(1, 5)
+        menu = menus[int(item["menuId"][1:]) - 1]
+        menu["rating_{}".format(rating)] += 1
+        reviews.append({
+            "item_id": item["menuId"],
+            "user_email": order["user_email"],
+            "review_text": "Review {}".format(i),
+            "rating": rating,
+            "order_id": order["order_id"],
+            "timestamp": order["timestamp"] + timedelta(hours=1),
+        })
+
+    feedbacks = [{
+        "name": "Visitor {}".format(i),
+        "email": "visitor{}@bench.local".format(i),
+        "phone": "0800000000",
+        "message": "Feedback {}".format(i),
+        "timestamp": now - timedelta(hours=i),
+    } for i in range(args.feedbacks)]
+
+    for name, docs in [("menu", menus), ("users", users), ("orders", orders),
+                       ("reviews", reviews), ("feedbacks", feedbacks)]:
+        if docs:
+            db[name].insert_many(docs)
+    db.vouchers.insert_one({"code": "BENCH10", "discount": 10000, "is_valid": True})
+
+    # aggregate turunan dibangun dengan command yang sama seperti di production
+    runner = app_module.app.test_cli_runner()
+    for command in (["backfill-ratings"], ["rebuild-sales-rollup"], ["ensure-indexes"]):
+        result = runner.invoke(args=command)
+        if result.exit_code != 0:
+            print("Command {} failed: {}".format(" ".join(command), result.output), file=sys.stderr)
+    app_module.seed_order_counter()
+    app_module.invalidate_menu_cache()
+
+    return {"menus": menus, "users": users, "orders": orders}
+
+
+def build_scenarios(data, rng):
+    menus = data["menus"]
+    orders = data["orders"]
+    users = [user["email"] for user in data["users"] if user["role"] == "USER"]
+
+    def menu_id():
+        return rng.choice(menus)["menuId"]
+
+    def order_id():
+        return rng.choice(orders)["order_id"]
+
+    def add_to_cart():
+        return {"data": {"menuId": menu_id(), "quantity": "1", "option1": "Hot", "option2": "Regular Sugar"}}
+
+    # (nama, role, method, path, kwargs) - path dan kwargs boleh callable supaya tiap request beda
+    return [
+        ("home", "anon", "GET", "/", None),
+        ("about", "anon", "GET", "/about/", None),
+        ("contact", "anon", "GET", "/contact/", None),
+        ("menu", "anon", "GET", "/menu/", None),
+        ("filter_menu", "anon", "GET", lambda: "/filter_menu?category=" + rng.choice(CATEGORIES), None),
+        ("product", "anon", "GET", lambda: "/product/" + menu_id(), None),
+        ("api_reviews", "anon", "GET", lambda: "/api/reviews/" + menu_id(), None),
+        ("home_user", "user", "GET", "/", None),
+        ("menu_user", "user", "GET", "/menu/", None),
+        ("product_user", "user", "GET", lambda: "/product/" + menu_id(), None),
+        ("profile", "user", "GET", "/profile/", None),
+        ("order_history", "user", "GET", "/order_history", None),
+        ("cart", "user", "GET", "/cart/", None),
+        ("add_to_cart", "user", "POST", "/add_to_cart", add_to_cart),
+        ("update_quantity", "user", "POST", "/update_quantity",
+         lambda: {"json": {"menu_id": menu_id(), "quantity": rng.randint(1, 3)}}),
+        ("apply_voucher", "user", "POST", "/apply_voucher", {"data": {"voucher_code": "BENCH10"}}),
+        ("checkout", "user", "POST", "/confirm_purchase", None),
+        ("view_bill", "admin", "GET", lambda: "/view_bill/{}".format(order_id()), None),
+        ("view_receipt", "admin", "GET", lambda: "/view_receipt/{}".format(order_id()), None),
+        ("dashboard", "admin", "GET", "/dashboard/", None),
+        ("admin_orders", "admin", "GET", "/admin_orders/", None),
+        ("admin_update_menu", "admin", "GET", "/admin_update_menu/", None),
+        ("admin_user_list", "admin", "GET", "/admin_user_list/", None),
+        ("admin_feedbacks", "admin", "GET", "/admin_feedbacks/", None),
+        ("api_overview", "admin", "GET", "/api/overview", None),
+        ("api_orders", "admin", "GET", "/api/orders", None),
+        ("api_orders_filtered", "admin", "GET",
+         lambda: "/api/orders?status={}&sort=value".format(rng.choice(STATUSES)), None),
+        ("api_users", "admin", "GET", "/api/users", None),
+    ], users
+
+
+def checkout_path(client, data, rng):
+    menus = data["menus"]
+
+    def path():
+        response = client.post("/add_to_cart", data={
+            "menuId": rng.choice(menus)["menuId"], "quantity": "1",
+            "option1": "Hot", "option2": "Regular Sugar",
+        })
+        failure = failure_message(response)
+        response.close()
+        if failure:
+            # checkout dengan cart kosong tidak mengukur apa-apa
+            raise RuntimeError("add_to_cart before checkout failed: {}".format(failure))
+        return "/confirm_purchase"
+
+    return path
+
+
+def failure_message(response):
+    """Pesan error untuk status >= 500 atau body JSON {"success": false}, None kalau berhasil."""
+    if response.status_code >= 500:
+        return "HTTP {}".format(response.status_code)
+    body = response.get_json(silent=True) if response.is_json else None
+    if isinstance(body, dict) and body.get("success") is False:
+        return body.get("message") or "success: false"
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def run_scenario(client, method, path, kwargs, count):
+    latencies = []
+    statuses = {}
+    errors = 0
+    started = time.perf_counter()
+    reported = set()
+    for _ in range(count):
+        try:
+            url = path() if callable(path) else path
+        except Exception as e:
+            statuses["setup_failed"] = statuses.get("setup_failed", 0) + 1
+            errors += 1
+            if str(e) not in reported:
+                reported.add(str(e))
+                print("{} setup failed: {}".format(method, e), file=sys.stderr)
+            continue
+        options = kwargs() if callable(kwargs) else (kwargs or {})
+        t0 = time.perf_counter()
+        failure = None
+        try:
+            response = client.open(url, method=method, **options)
+            status = response.status_code
+            failure = failure_message(response)
+            response.close()
+        except Exception as e:
+            status = "exception"
+            failure = str(e)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if failure:
+            # mis. operasi yang tidak didukung mongomock: status 200 tapi success: false
+            errors += 1
+            if failure not in reported:
+                reported.add(failure)
+                print("{} {} failed: {}".format(method, url, failure), file=sys.stderr)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "count": count,
+        "errors": errors,
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+        "rps": round(count / elapsed, 1) if elapsed else 0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, previous=None):
+    header = "{:<22} {:>9} {:>9} {:>9} {:>9} {:>7}".format("route", "p50 ms", "p95 ms", "p99 ms", "rps", "errors")
+    if previous:
+        header += " {:>10}".format("p95 delta")
+    print(header)
+    for name, stats in results.items():
+        line = "{:<22} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.1f} {:>7}".format(
+            name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["rps"], stats["errors"]
+        )
+        old = (previous or {}).get(name)
+        if old and old["p95_ms"]:
+            line += " {:>+9.1f}%".format((stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100)
+        print(line)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    app_module = load_app(args)
+
+    print("Seeding {} on {}...".format(args.db, "mongomock" if args.mongomock else args.mongodb_uri))
+    data = seed(app_module, args, rng)
+    scenarios, user_emails = build_scenarios(data, rng)
+
+    clients = {"anon": app_module.app.test_client(), "admin": app_module.app.test_client()}
+    clients["admin"].set_cookie("mytoken", make_token(app_module, "admin@bench.local"))
+    if user_emails:
+        clients["user"] = app_module.app.test_client()
+        clients["user"].set_cookie("mytoken", make_token(app_module, rng.choice(user_emails)))
+
+    results = {}
+    for name, role, method, path, kwargs in scenarios:
+        if args.routes and args.routes not in name or role not in clients:
+            continue
+        client = clients[role]
+        if name == "checkout":
+            # setiap checkout butuh cart berisi, jadi isi dulu sebelum diukur
+            kwargs = None
+            path = checkout_path(client, data, rng)
+        run_scenario(client, method, path, kwargs, args.warmup)
+        results[name] = run_scenario(client, method, path, kwargs, args.requests)
+        print("{:<22} done".format(name))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "backend": "mongomock" if args.mongomock else "mongodb",
+            "seed": args.seed,
+            "requests_per_route": args.requests,
+            "data": {
+                "users": args.users, "menu": args.menu, "orders": args.orders,
+                "reviews": args.reviews, "feedbacks": args.feedbacks,
+            },
+        },
+        "routes": results,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["routes"]
+    print()
+    print_report(results, previous)
+
+    output = args.output or os.path.join(
+        ".data", "benchmarks", "{}-{}.json".format(datetime.now().strftime("%Y%m%d-%H%M%S"), report["meta"]["commit"] or "nogit")
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("\nSaved results to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
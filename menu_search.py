@@ -0,0 +1,118 @@
+from bisect import bisect_left, insort
+import re
+import threading
+import unicodedata
+
+
+# Inverted index di memori untuk pencarian menu berdasarkan nama dan deskripsi.
+# Teks di-normalisasi (huruf kecil, aksen dibuang: "Café" -> "cafe"), dipecah per kata,
+# dan stopword Indonesia/Inggris dibuang. Kata terakhir di query dianggap prefix supaya
+# bisa dipakai untuk autocomplete ("kop" -> "kopi"). Index di-sync secara incremental
+# dari katalog menu: hanya produk yang berubah/hilang yang di-index ulang.
+FIELD_WEIGHTS = {"nama": 3, "deskripsi": 1}
+STOPWORDS = {
+    "dan", "yang", "dengan", "di", "ke", "dari", "untuk", "atau", "ini", "itu", "pada", "juga",
+    "the", "and", "with", "of", "a", "an", "in", "on", "for", "or", "to",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(normalize(text)) if token not in STOPWORDS]
+
+
+class MenuSearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.terms = []
+        self.documents = {}
+        self.version = None
+
+    def document_terms(self, item):
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(item.get(field)):
+                terms[token] = terms.get(token, 0) + weight
+        return terms
+
+    def add(self, menu_id, signature, terms):
+        self.documents[menu_id] = (signature, terms)
+        for token, weight in terms.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                insort(self.terms, token)
+            self.postings[token][menu_id] = weight
+
+    def remove(self, menu_id):
+        _, terms = self.documents.pop(menu_id, (None, {}))
+        for token in terms:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(menu_id, None)
+            if not posting:
+                del self.postings[token]
+                self.terms.pop(bisect_left(self.terms, token))
+
+    def sync(self, items, version):
+        """Samakan index dengan katalog: produk baru/berubah di-index, yang terhapus dibuang."""
+        with self.lock:
+            if self.version == version:
+                return
+            seen = set()
+            for item in items:
+                menu_id = item["menuId"]
+                seen.add(menu_id)
+                signature = tuple(item.get(field) for field in FIELD_WEIGHTS)
+                current = self.documents.get(menu_id)
+                if current and current[0] == signature:
+                    continue
+                self.remove(menu_id)
+                self.add(menu_id, signature, self.document_terms(item))
+            for menu_id in set(self.documents) - seen:
+                self.remove(menu_id)
+            self.version = version
+
+    def prefix_terms(self, prefix):
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + "\uffff")
+        return self.terms[start:end]
+
+    def search(self, query, limit=20):
+        """Kembalikan menuId yang cocok dengan semua kata di query, diurutkan berdasarkan skor."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # kata terakhir dianggap prefix kecuali query diakhiri spasi
+        prefix = None if query[-1:].isspace() else tokens.pop()
+
+        with self.lock:
+            scores = None
+            for token in tokens:
+                posting = self.postings.get(token, {})
+                scores = dict(posting) if scores is None else {
+                    menu_id: score + posting[menu_id] for menu_id, score in scores.items() if menu_id in posting
+                }
+                if not scores:
+                    return []
+
+            if prefix is not None:
+                prefix_scores = {}
+                for term in self.prefix_terms(prefix):
+                    # kata yang persis sama diberi skor lebih tinggi dari sekadar prefix
+                    bonus = 2 if term == prefix else 1
+                    for menu_id, weight in self.postings[term].items():
+                        prefix_scores[menu_id] = max(prefix_scores.get(menu_id, 0), weight * bonus)
+                scores = prefix_scores if scores is None else {
+                    menu_id: score + prefix_scores[menu_id]
+                    for menu_id, score in scores.items() if menu_id in prefix_scores
+                }
+
+        ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [menu_id for menu_id, _ in ranked[:limit]]
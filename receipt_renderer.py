@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import pdfcrowd
+
+
+# Env dibaca saat dipakai (bukan saat import) karena app.py memanggil load_dotenv
+# setelah modul ini di-import.
+# RECEIPT_RENDERER: "local" (WeasyPrint, tanpa network) atau "pdfcrowd" (API eksternal, cara lama).
+# RECEIPT_RENDER_TIMEOUT: batas detik render lokal sebelum request dianggap gagal.
+
+render_pool = None
+render_pool_lock = threading.Lock()
+
+
+class ReceiptRenderError(Exception):
+    pass
+
+
+def render_local(html, base_url):
+    # import di sini supaya WeasyPrint tetap opsional kalau backend pdfcrowd yang dipakai
+    from weasyprint import HTML
+
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def render_pdfcrowd(html, base_url):
+    client = pdfcrowd.HtmlToPdfClient(os.environ.get("API_USERNAME"), os.environ.get("API_KEY"))
+    return client.convertString(html)
+
+
+RENDERERS = {
+    "local": render_local,
+    "pdfcrowd": render_pdfcrowd,
+}
+
+
+def get_render_pool():
+    global render_pool
+    with render_pool_lock:
+        if render_pool is None:
+            max_workers = int(os.environ.get("RECEIPT_RENDER_WORKERS", 2))
+            render_pool = ProcessPoolExecutor(max_workers=max_workers)
+        return render_pool
+
+
+def discard_render_pool(pool):
+    # proses yang hang tidak bisa dibatalkan lewat future, jadi pool dibuang dan prosesnya dihentikan;
+    # request berikutnya membuat pool baru
+    global render_pool
+    with render_pool_lock:
+        if render_pool is pool:
+            render_pool = None
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def order_content_hash(order):
+    content = json.dumps(order, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def receipt_cache_folder():
+    return os.environ.get("RECEIPT_CACHE_FOLDER", "./.data/receipts")
+
+
+def receipt_cache_path(order_id, content_hash):
+    return os.path.join(receipt_cache_folder(), "{}-{}.pdf".format(order_id, content_hash))
+
+
+def remove_stale_receipts(order_id, keep_path):
+    # versi lama (misalnya sebelum status order berubah) tidak akan dibaca lagi
+    for stale_path in glob.glob(os.path.join(receipt_cache_folder(), "{}-*.pdf".format(order_id))):
+        if stale_path != keep_path:
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+
+
+def render_receipt(order_id, order, render_html, base_url=None):
+    """Kembalikan PDF receipt dari cache disk, atau render lalu simpan ke cache.
+
+    render_html hanya dipanggil kalau cache miss, jadi template tidak di-render ulang.
+    """
+    path = receipt_cache_path(order_id, order_content_hash(order))
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    renderer_name = os.environ.get("RECEIPT_RENDERER", "local")
+    renderer = RENDERERS.get(renderer_name)
+    if renderer is None:
+        raise ReceiptRenderError("Unknown receipt renderer: {}".format(renderer_name))
+
+    html = render_html()
+    try:
+        if renderer is render_local:
+            # render lokal berat di CPU, jalankan di process pool supaya worker web tidak tertahan
+            pool = get_render_pool()
+            timeout = float(os.environ.get("RECEIPT_RENDER_TIMEOUT", 30))
+            try:
+                pdf = pool.submit(render_local, html, base_url).result(timeout=timeout)
+            except FutureTimeoutError:
+                discard_render_pool(pool)
+                raise ReceiptRenderError("Receipt render timed out after {:g}s".format(timeout))
+        else:
+            pdf = renderer(html, base_url)
+    except ReceiptRenderError:
+        raise
+    except pdfcrowd.Error as why:
+        raise ReceiptRenderError(str(why))
+    except Exception as e:
+        raise ReceiptRenderError("Failed to render receipt: {}".format(e))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # tulis ke file sementara dulu supaya request lain tidak membaca PDF setengah jadi
+    tmp_path = "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    remove_stale_receipts(order_id, path)
+    return pdf
@@ -0,0 +1,143 @@
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+
+# Metrics per route (latency, jumlah command Mongo per request) dan per collection/command
+# Mongo, disimpan di memori per worker lalu ditampilkan dalam format teks Prometheus.
+# Command dari thread di luar request (misalnya upload gambar) hanya masuk metrics per collection.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+QUERY_COUNT_HEADER = "X-Mongo-Query-Count"
+
+metrics_lock = threading.Lock()
+request_state = threading.local()
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        with metrics_lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help_text), "# TYPE {} histogram".format(self.name)]
+        with metrics_lock:
+            for labels, series in sorted(self.series.items()):
+                label_text = ",".join(
+                    '{}="{}"'.format(name, escape_label(value)) for name, value in zip(self.label_names, labels)
+                )
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, label_text, bound, count))
+                lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(self.name, label_text, series["count"]))
+                lines.append("{}_sum{{{}}} {}".format(self.name, label_text, round(series["sum"], 6)))
+                lines.append("{}_count{{{}}} {}".format(self.name, label_text, series["count"]))
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency per route.",
+    ("route", "method", "status"), LATENCY_BUCKETS,
+)
+request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "Mongo commands issued per request.",
+    ("route", "method"), COMMAND_COUNT_BUCKETS,
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency per collection and command.",
+    ("collection", "command", "outcome"), LATENCY_BUCKETS,
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self.pending_lock:
+            self.pending[(event.connection_id, event.request_id)] = collection
+        if getattr(request_state, "active", False):
+            request_state.commands += 1
+        # dipakai audit (flask audit-projections) untuk melihat command yang dikirim route
+        captured = getattr(request_state, "captured", None)
+        if captured is not None:
+            captured.append((event.command_name, collection, dict(event.command.get("projection") or {})))
+
+    def finish(self, event, outcome):
+        with self.pending_lock:
+            collection = self.pending.pop((event.connection_id, event.request_id), "-")
+        mongo_command_duration.observe((collection, event.command_name, outcome), event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self.finish(event, "ok")
+
+    def failed(self, event):
+        self.finish(event, "error")
+
+
+mongo_listener = MongoCommandListener()
+
+
+def start_request_metrics():
+    request_state.active = True
+    request_state.commands = 0
+    g.metrics_started_at = time.perf_counter()
+
+
+def finish_request_metrics(response, debug):
+    if not getattr(request_state, "active", False):
+        return response
+    request_state.active = False
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = time.perf_counter() - g.metrics_started_at
+    request_duration.observe((route, request.method, str(response.status_code)), elapsed)
+    request_mongo_commands.observe((route, request.method), request_state.commands)
+    if debug:
+        response.headers[QUERY_COUNT_HEADER] = str(request_state.commands)
+    return response
+
+
+def init_request_metrics(app):
+    app.before_request(start_request_metrics)
+    app.after_request(lambda response: finish_request_metrics(response, app.debug))
+
+
+def start_capture():
+    request_state.captured = []
+
+
+def stop_capture():
+    captured = getattr(request_state, "captured", None) or []
+    request_state.captured = None
+    return captured
+
+
+def render_metrics():
+    lines = []
+    for histogram in (request_duration, request_mongo_commands, mongo_command_duration):
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
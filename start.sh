@@ -14,5 +14,12 @@ fi
 
 $VIRTUALENV/bin/pip install -r requirements.txt
 
-$VIRTUALENV/bin/python3 app.py
+$VIRTUALENV/bin/flask --app app ensure-indexes
+
+# APP_ENV=development menjalankan dev server Flask (debug, satu proses)
+if [ "${APP_ENV:-production}" = "development" ]; then
+  $VIRTUALENV/bin/python3 app.py
+else
+  exec $VIRTUALENV/bin/gunicorn -c gunicorn.conf.py wsgi:app
+fi
 Footer
\ No newline at end of file
@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "coffeeshop_test")
+os.environ.setdefault("IMAGE_UPLOAD_BACKEND", "local")
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    app_module = pytest.importorskip("app")
+    mongomock = pytest.importorskip("mongomock")
+
+    monkeypatch.setattr(app_module, "db", mongomock.MongoClient()["coffeeshop_test"])
+    app_module.app.config["TESTING"] = True
+    app_module.drop_menu_cache()
+    app_module.drop_user_cache()
+    monkeypatch.setitem(app_module.version_check, "checked_at", None)
+    for name in app_module.seen_versions:
+        monkeypatch.setitem(app_module.seen_versions, name, None)
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def login(app_module, client):
+    import jwt
+
+    def login(email, role="USER"):
+        app_module.db.users.insert_one({
+            "email": email,
+            "user_name": email.split("@")[0],
+            "role": role,
+            "profile_image": None,
+        })
+        payload = {"id": email, "exp": datetime.now(timezone.utc) + timedelta(minutes=10)}
+        client.set_cookie("mytoken", jwt.encode(payload, app_module.SECRET_KEY, algorithm="HS256"))
+        return client
+
+    return login
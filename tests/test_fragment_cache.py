@@ -0,0 +1,34 @@
+import threading
+
+
+def reload_catalog_in_other_thread(app_module):
+    def reload():
+        app_module.drop_menu_cache()
+        app_module.load_menu_catalog()
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    thread.join()
+
+
+def test_fragment_version_follows_the_snapshot_the_view_read(app_module):
+    app_module.db.menu.insert_one({"menuId": "C01", "nama": "Kopi", "harga": "15000", "kategori": ["Coffee"]})
+    with app_module.app.test_request_context("/"):
+        catalog = app_module.load_menu_catalog()
+        reload_catalog_in_other_thread(app_module)
+
+        assert app_module.menu_data_version() == (catalog["version"], catalog["generation"])
+
+
+def test_fragment_is_not_stored_when_request_read_two_snapshots(app_module):
+    import fragment_cache
+
+    with app_module.app.test_request_context("/"):
+        app_module.load_menu_catalog()
+        reload_catalog_in_other_thread(app_module)
+        app_module.load_menu_catalog()
+        assert app_module.menu_data_version() is None
+
+        template = app_module.app.jinja_env.from_string('{% cache "test_fragment" %}x{% endcache %}')
+        assert template.render() == "x"
+        assert fragment_cache.fragment_cache_stats()["entries"] == 0
@@ -0,0 +1,71 @@
+import pytest
+
+
+class CountingDatabase:
+    """Bungkus db dan catat setiap akses collection, mongomock tidak mengirim event command."""
+
+    def __init__(self, db):
+        self.db = db
+        self.collections = []
+
+    def __getattr__(self, name):
+        self.collections.append(name)
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        self.collections.append(name)
+        return self.db[name]
+
+
+@pytest.fixture
+def menu(app_module):
+    app_module.db.menu.insert_many([
+        {
+            "menuId": "C0{}".format(i),
+            "nama": "Kopi {}".format(i),
+            "harga": "{}".format(15000 + i * 1000),
+            "deskripsi": "Kopi susu",
+            "kategori": ["Coffee"],
+            "image": "",
+            "sold": i,
+        }
+        for i in range(1, 5)
+    ])
+
+
+@pytest.mark.parametrize("path", ["/", "/menu/", "/about/"])
+def test_anonymous_cache_hit_does_not_query_mongo(app_module, client, menu, monkeypatch, path):
+    monkeypatch.setattr(app_module, "CACHE_VERSION_CHECK_INTERVAL", 3600)
+    first = client.get(path)
+    assert first.status_code == 200
+
+    counting = CountingDatabase(app_module.db)
+    monkeypatch.setattr(app_module, "db", counting)
+    second = client.get(path)
+
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert counting.collections == []
+
+
+def test_anonymous_cache_hit_revalidates_with_etag(app_module, client, menu, monkeypatch):
+    monkeypatch.setattr(app_module, "CACHE_VERSION_CHECK_INTERVAL", 3600)
+    first = client.get("/")
+    assert first.headers["ETag"]
+
+    counting = CountingDatabase(app_module.db)
+    monkeypatch.setattr(app_module, "db", counting)
+    second = client.get("/", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert second.status_code == 304
+    assert counting.collections == []
+
+
+def test_version_bump_from_another_worker_clears_page_cache(app_module, client, menu, monkeypatch):
+    monkeypatch.setattr(app_module, "CACHE_VERSION_CHECK_INTERVAL", 0)
+    client.get("/")
+    app_module.db.menu.update_one({"menuId": "C01"}, {"$set": {"nama": "Kopi Baru"}})
+    # worker lain mengubah menu: hanya versi bersama yang naik, cache worker ini belum dibuang
+    app_module.db.counters.update_one({"_id": app_module.CACHE_VERSION_ID}, {"$inc": {"menu": 1}}, upsert=True)
+
+    assert b"Kopi Baru" in client.get("/").get_data()
@@ -0,0 +1,45 @@
+import base64
+
+import pytest
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+MALFORMED_CURSORS = [
+    raw_cursor('[{"$oid": "zz"}]'),
+    raw_cursor('[{"$gt": ""}, {"$oid": "000000000000000000000000"}]'),
+    raw_cursor("not json"),
+    "%%%",
+]
+
+
+@pytest.mark.parametrize("cursor", MALFORMED_CURSORS)
+def test_decode_cursor_rejects_malformed_values(app_module, cursor):
+    assert app_module.decode_cursor(cursor) is None
+
+
+def test_cursor_round_trip(app_module):
+    from bson import ObjectId
+
+    object_id = ObjectId()
+    assert app_module.decode_cursor(app_module.encode_cursor("C01", object_id)) == ["C01", object_id]
+
+
+@pytest.mark.parametrize("path", ["/filter_menu", "/api/reviews/C01"])
+def test_malformed_oid_cursor_is_400(client, path):
+    response = client.get(path, query_string={"cursor": raw_cursor('[{"$oid": "zz"}]')})
+    assert response.status_code == 400
+
+
+def test_malformed_oid_cursor_is_400_for_order_history(login):
+    client = login("customer@example.com")
+    response = client.get("/api/order_history", query_string={"cursor": raw_cursor('[{"$oid": "zz"}]')})
+    assert response.status_code == 400
+
+
+def test_malformed_oid_cursor_is_400_for_admin_orders(login):
+    client = login("admin@example.com", role="ADMIN")
+    response = client.get("/api/orders", query_string={"cursor": raw_cursor('[{"$oid": "zz"}]')})
+    assert response.status_code == 400
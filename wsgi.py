@@ -0,0 +1,2 @@
+# Entry point WSGI untuk production: gunicorn -c gunicorn.conf.py wsgi:app
+from app import app